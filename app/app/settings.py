@@ -9,7 +9,9 @@ https://docs.djangoproject.com/en/3.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
+import math
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,9 +45,9 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
-    'rest_framework.authtoken',
     'drf_spectacular',
     'user',
     'recipe',
@@ -81,20 +83,106 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# How the container serves the app, 'wsgi' with uWSGI or 'asgi' with
+# Gunicorn running Uvicorn workers, where the recipe API views are async.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+# Threads per ASGI worker running the code and queries of the async views,
+# so also the most database connections each worker opens for them.
+ASGI_VIEW_THREADS = int(os.environ.get('ASGI_VIEW_THREADS', 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections are kept for DB_CONN_MAX_AGE seconds, 0 closes them after
+# each request, and with DB_CONN_HEALTH_CHECKS checked before reuse. Set
+# DB_TRANSACTION_POOLING behind a pooler in transaction mode, like PgBouncer.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db',
         "HOST": os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))
+        ),
+        'TRANSACTION_POOLING': bool(
+            int(os.environ.get('DB_TRANSACTION_POOLING', 0))
+        ),
     }
 }
 
+# Streaming replicas of the primary, as comma separated host[:port]. Safe
+# requests on the recipe API read from one that lags at most
+# REPLICA_MAX_LAG_SECONDS, its lag is checked every REPLICA_LAG_CHECK_SECONDS.
+# A replica that could not be reached is tried again after
+# REPLICA_RETRY_SECONDS.
+# A user's writes send their reads to the primary for REPLICA_PIN_SECONDS,
+# longer than a replica in use can lag, so users read their own writes.
+_REPLICA_HOSTS = [
+    host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',')
+    if host.strip()
+]
+DATABASES.update({
+    f'replica_{index}': {
+        **DATABASES['default'],
+        'HOST': host.partition(':')[0],
+        'PORT': host.partition(':')[2],
+        'OPTIONS': {
+            'connect_timeout': int(
+                os.environ.get('DB_REPLICA_CONNECT_TIMEOUT', 2)
+            ),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    for index, host in enumerate(_REPLICA_HOSTS)
+})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_LAG_CHECK_SECONDS = float(
+    os.environ.get('REPLICA_LAG_CHECK_SECONDS', 1)
+)
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+REPLICA_PIN_SECONDS = int(os.environ.get(
+    'REPLICA_PIN_SECONDS',
+    math.ceil(REPLICA_MAX_LAG_SECONDS + REPLICA_LAG_CHECK_SECONDS),
+))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Use django_redis.cache.RedisCache with a redis:// location in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', 300))
+
+# How long API tokens stay valid after they are issued or refreshed.
+AUTH_TOKEN_TTL = timedelta(
+    hours=int(os.environ.get('AUTH_TOKEN_TTL_HOURS', 24 * 7))
+)
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 300)
+)
+AUTH_TOKEN_LOCAL_CACHE_TTL = int(
+    os.environ.get('AUTH_TOKEN_LOCAL_CACHE_TTL', 5)
+)
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(
+    os.environ.get('AUTH_TOKEN_LOCAL_CACHE_SIZE', 10000)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -114,6 +202,45 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# https://docs.djangoproject.com/en/3.2/topics/auth/passwords/
+# New passwords are hashed with the first hasher, the others verify older
+# hashes, which are rehashed with the first one on the next login.
+
+try:
+    import argon2  # noqa: F401
+    _DEFAULT_PASSWORD_HASHER = 'argon2'
+except ImportError:
+    _DEFAULT_PASSWORD_HASHER = 'scrypt'
+
+_PREFERRED_HASHERS = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'scrypt': 'core.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', _DEFAULT_PASSWORD_HASHER)
+PASSWORD_HASHERS = [_PREFERRED_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PREFERRED_HASHERS.items()
+    if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19 * 1024))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+SCRYPT_WORK_FACTOR = int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 14))
+
+# Threads verifying passwords for the async token view, so hashing never
+# blocks the event loop and at most this many hashes run at once.
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+)
+AUTH_TOKEN_VIEW_ASYNC = bool(int(
+    os.environ.get('AUTH_TOKEN_VIEW_ASYNC', int(SERVER_MODE == 'asgi'))
+))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -138,6 +265,21 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Recipe images are resized into these renditions (longest side in pixels)
+# by a background worker pool after upload.
+RECIPE_IMAGE_RENDITIONS = {'thumb': 150, 'medium': 600, 'large': 1200}
+RECIPE_IMAGE_FORMAT = os.environ.get('RECIPE_IMAGE_FORMAT', 'WEBP')
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+# Unreferenced images written or reused by an upload this recently are
+# skipped by gc_recipe_images, their upload may still be in progress.
+RECIPE_IMAGE_GC_GRACE_MINUTES = int(
+    os.environ.get('RECIPE_IMAGE_GC_GRACE_MINUTES', 60)
+)
+# Matches client_max_body_size of the proxy.
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 2 ** 20)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -149,6 +291,41 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
 }
 
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# Most matches of a recipe search ranked, the newest ones. Searches for a
+# common word return the best of these instead of ranking every recipe.
+RECIPE_SEARCH_MAX_RANKED = int(
+    os.environ.get('RECIPE_SEARCH_MAX_RANKED', 1000)
+)
+
+# Most tag and ingredient name suggestions returned per request.
+RECIPE_SUGGEST_LIMIT = 10
+
+# Records validated and written per transaction by bulk recipe imports.
+RECIPE_IMPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_IMPORT_CHUNK_SIZE', 1000)
+)
+# Recipes fetched per server side cursor round trip by recipe exports.
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'recipe': {
+            'handlers': ['console'],
+            'level': os.environ.get('RECIPE_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
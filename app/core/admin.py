@@ -43,7 +43,19 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class AuthTokenAdmin(admin.ModelAdmin):
+    """Define the admin pages for auth tokens."""
+    list_display = ['user', 'created', 'expires_at']
+    search_fields = ['user__email']
+    readonly_fields = ['key_hash', 'user', 'created']
+
+    def has_add_permission(self, request):
+        # Keys are only known when issued, to the client logging in.
+        return False
+
+
 admin.site.register(models.User, UserAdmin)
+admin.site.register(models.AuthToken, AuthTokenAdmin)
 admin.site.register(models.Ingredient)
 admin.site.register(models.Recipe)
 admin.site.register(models.Tag)
@@ -0,0 +1,148 @@
+"""
+Async serving of the sync API views under ASGI
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.db import close_old_connections, connections
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the pool running the async views, created on first use.
+
+    Django 3.2 runs every sync view of an ASGI worker on one shared thread,
+    so a slow query holds up all the others. The pool lets that many views
+    wait on the database at once, each thread with its own connection.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASGI_VIEW_THREADS,
+                thread_name_prefix='asgi-view',
+            )
+    return _executor
+
+
+def _call_with_connection(func, *args, **kwargs):
+    """Call func, closing the thread's connection as a request would."""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_thread(func, *args, **kwargs):
+    """Run func, which may query the database, in the pool and wait for it.
+
+    Context variables are copied into the thread, as sync_to_async does.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(
+        context.run, _call_with_connection, func, *args, **kwargs
+    ))
+
+
+def async_view(view):
+    """Return an async view running view in the pool.
+
+    The response is rendered in the pool too, so serializing it does not
+    block the event loop.
+    """
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_db_thread(respond, request, *args, **kwargs)
+
+    return wrapper
+
+
+def serve_async(urlpatterns):
+    """Make the views of urlpatterns async when serving over ASGI."""
+    if settings.SERVER_MODE == 'asgi':
+        for pattern in urlpatterns:
+            pattern.callback = async_view(pattern.callback)
+    return urlpatterns
+
+
+def _next_part(parts):
+    return next(parts, None)
+
+
+def _close_stream(response):
+    response.close()
+    connections.close_all()
+
+
+class ASGIHandler(BaseASGIHandler):
+    """ASGI handler iterating streaming responses off the event loop.
+
+    Django 3.2 iterates them on the event loop, where a generator reading
+    the database, like the recipe export, raises SynchronousOnlyOperation.
+    Each stream gets a thread of its own, as its server side cursor must
+    stay on one connection.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ] + [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='asgi-stream'
+        ) as executor:
+            try:
+                parts = iter(response)
+                while True:
+                    part = await loop.run_in_executor(
+                        executor, _next_part, parts
+                    )
+                    if part is None:
+                        break
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+                await send({'type': 'http.response.body'})
+            finally:
+                await loop.run_in_executor(
+                    executor, _close_stream, response
+                )
+
+
+def get_asgi_application():
+    """Return the ASGI callable, as django.core.asgi does."""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,57 @@
+"""
+PostgreSQL backend with connection health checks and pooler support
+"""
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL connections checked before reuse and safe to pool.
+
+    With CONN_HEALTH_CHECKS a persistent connection is checked with a round
+    trip before its first use in each request, and replaced if the server
+    dropped it, as Django 4.1 does.
+
+    With TRANSACTION_POOLING, for a pooler like PgBouncer in transaction
+    mode, server side cursors are only used inside transactions. Outside
+    of one, each fetch may run on another server connection, where the
+    cursor does not exist.
+    """
+
+    health_check_done = False
+
+    def connect(self):
+        # A new connection needs no check, nor do the queries setting it up.
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        # Reading the autocommit state here needs no health check, the
+        # next request does it.
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        """Close the connection if it does not answer, once per request."""
+        if (
+            self.connection is None or
+            self.health_check_done or
+            self.in_atomic_block or
+            not self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
+
+    def chunked_cursor(self):
+        if (
+            self.settings_dict.get('TRANSACTION_POOLING') and
+            not self.in_atomic_block
+        ):
+            return self.cursor()
+        return super().chunked_cursor()
@@ -0,0 +1,65 @@
+"""
+Django command to benchmark persistent database connections.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+from core.models import Recipe
+
+
+MODES = {
+    'new connection': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False},
+    'persistent, checked': {
+        'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+
+class Command(BaseCommand):
+    """Time the database work of a request per connection mode"""
+
+    help = 'Report the per request latency of a query with a new, a ' \
+        'persistent and a health checked persistent connection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        saved = {
+            key: connection.settings_dict[key]
+            for key in MODES['new connection']
+        }
+        timings = {}
+        try:
+            for mode, settings_dict in MODES.items():
+                connection.close()
+                connection.settings_dict.update(settings_dict)
+                timings[mode] = self._time_requests(options['requests'])
+        finally:
+            connection.close()
+            connection.settings_dict.update(saved)
+
+        for mode, median in timings.items():
+            self.stdout.write(f'{mode:<20} {median:7.3f} ms per request')
+        saving = timings['new connection'] - timings['persistent, checked']
+        self.stdout.write(
+            f'Persistent connections save {saving:.3f} ms per request '
+            f'with health checks.'
+        )
+
+    def _time_requests(self, requests):
+        """Return the median ms of a request running one query."""
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            Recipe.objects.filter(pk=0).exists()
+            request_finished.send(sender=self.__class__)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,72 @@
+"""
+Django command to benchmark login throughput per password hasher.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hashers_by_algorithm,
+    make_password,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+
+PASSWORD = 'benchmark-pass-123'
+
+
+class Command(BaseCommand):
+    """Time password verification, the CPU cost of a login"""
+
+    help = 'Report logins per second and per core for each password hasher.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hashers', nargs='+',
+            default=['pbkdf2_sha256', 'scrypt', 'argon2'],
+            help='Algorithms to compare, PBKDF2 being the old default.'
+        )
+        parser.add_argument('--seconds', type=float, default=3.0)
+        parser.add_argument(
+            '--threads', type=int, default=os.cpu_count() or 1,
+            help='Threads verifying at once for the all cores figure.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        available = get_hashers_by_algorithm()
+        for algorithm in options['hashers']:
+            if algorithm not in available:
+                raise CommandError(f'Unknown hasher {algorithm!r}.')
+            try:
+                encoded = make_password(PASSWORD, hasher=algorithm)
+            except ValueError as exc:
+                self.stderr.write(f'{algorithm:<14} skipped: {exc}')
+                continue
+
+            per_core = self._rate(encoded, options['seconds'], 1)
+            all_cores = self._rate(
+                encoded, options['seconds'], options['threads']
+            )
+            self.stdout.write(
+                f'{algorithm:<14} {per_core:8.1f} logins/s per core '
+                f'{all_cores:8.1f} logins/s on {options["threads"]} threads'
+            )
+
+    def _rate(self, encoded, seconds, threads):
+        """Return how many times per second threads verify encoded."""
+        def verify():
+            count = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                if not check_password(PASSWORD, encoded):
+                    raise CommandError('Password did not verify.')
+                count += 1
+            return count
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(verify) for _ in range(threads)]
+            total = sum(future.result() for future in futures)
+        return total / (time.perf_counter() - start)
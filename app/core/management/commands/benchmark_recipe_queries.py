@@ -0,0 +1,153 @@
+"""
+Django command to benchmark recipe list query plans.
+"""
+import random
+import re
+import statistics
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Recipe, Tag
+from recipe.counts import recompute_recipe_counts
+from recipe.filters import RecipeAttrFilter, RecipeSearchFilter
+from recipe.search import update_search_vectors
+
+
+EXECUTION_TIME = re.compile(r'Execution Time: ([\d.]+) ms')
+
+
+class Command(BaseCommand):
+    """Compare recipe list query plans on a seeded data set"""
+
+    help = 'Seed a benchmark user and time recipe list query plans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--filter-tags', type=int, default=3)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--email', default='benchmark@example.com')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        user = self._seed(options)
+        tag_ids = list(
+            Tag.objects.filter(user=user).values_list('id', flat=True)
+        )
+        filter_ids = random.Random(0).sample(
+            tag_ids, min(options['filter_tags'], len(tag_ids))
+        )
+        base = Recipe.objects.filter(user=user).order_by('-id')
+        backend = RecipeAttrFilter()
+
+        search = RecipeSearchFilter()
+
+        plans = {
+            'join + distinct': base.filter(
+                tags__id__in=filter_ids).distinct(),
+            'exists (any)': backend.filter_relation(
+                base, 'tags', filter_ids, 'any'),
+            'exists (all)': backend.filter_relation(
+                base, 'tags', filter_ids, 'all'),
+            # One title in the data set has the number, every title has
+            # the word.
+            'search (selective)': search.search(
+                base, str(options['recipes'] // 2)).order_by('-rank', '-id'),
+            'search (common)': search.search(
+                base, 'benchmark').order_by('-rank', '-id'),
+            'search (common, tags)': search.search(
+                backend.filter_relation(base, 'tags', filter_ids, 'any'),
+                'benchmark').order_by('-rank', '-id'),
+            # Quick recipes are 5% of the data set, cheap ones 1%.
+            'time <= 6 by time': base.filter(
+                time_minutes__lte=6).order_by('time_minutes', 'id'),
+            'time <= 6 newest': base.filter(time_minutes__lte=6),
+            'price <= 0.49 by price': base.filter(
+                price__lte=Decimal('0.49')).order_by('-price', '-id'),
+            'price <= 0.49 newest': base.filter(price__lte=Decimal('0.49')),
+        }
+        self._report(plans, options['runs'], options['verbosity'])
+
+    def _seed(self, options):
+        """Create the benchmark user, tags and recipes if missing."""
+        user, created = get_user_model().objects.get_or_create(
+            email=options['email']
+        )
+        tags = [
+            Tag(user=user, name=f'Tag {i}')
+            for i in range(Tag.objects.filter(user=user).count(),
+                           options['tags'])
+        ]
+        Tag.objects.bulk_create(tags)
+
+        missing = options['recipes'] - Recipe.objects.filter(user=user).count()
+        if missing <= 0:
+            return user
+
+        self.stdout.write(f'Seeding {missing} recipes.........')
+        last_id = Recipe.objects.filter(user=user).order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        batch_size = 5000
+        for start in range(0, missing, batch_size):
+            Recipe.objects.bulk_create([
+                Recipe(
+                    user=user,
+                    title=f'Benchmark recipe {start + i}',
+                    time_minutes=(start + i) % 120 + 1,
+                    price=Decimal((start + i) % 5000) / 100,
+                )
+                for i in range(min(batch_size, missing - start))
+            ])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Recipe.tags.through._meta.db_table}
+                    (recipe_id, tag_id)
+                SELECT DISTINCT r.id, t.ids[1 + floor(
+                    random() * array_length(t.ids, 1))::int]
+                FROM {Recipe._meta.db_table} r
+                CROSS JOIN generate_series(1, %s)
+                CROSS JOIN (
+                    SELECT array_agg(id) AS ids
+                    FROM {Tag._meta.db_table} WHERE user_id = %s
+                ) t
+                WHERE r.user_id = %s AND r.id > %s
+                ON CONFLICT DO NOTHING
+                """,
+                [options['tags_per_recipe'], user.id, user.id, last_id],
+            )
+        update_search_vectors(
+            Recipe.objects.filter(user=user, id__gt=last_id)
+        )
+        recompute_recipe_counts(Tag, 'tags')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+            cursor.execute(
+                f'ANALYZE {Recipe.tags.through._meta.db_table}'
+            )
+
+        return user
+
+    def _report(self, plans, runs, verbosity):
+        """Print the median execution time of each plan's first page."""
+        for name, queryset in plans.items():
+            page = queryset[:settings.API_PAGE_SIZE + 1]
+            timings = []
+            for _ in range(runs):
+                plan = page.explain(analyze=True, buffers=True)
+                timings.append(
+                    float(EXECUTION_TIME.search(plan).group(1))
+                )
+            self.stdout.write(
+                f'{name:<24} rows={queryset.count():<8} '
+                f'median={statistics.median(timings):.2f}ms'
+            )
+            if verbosity > 1:
+                self.stdout.write(plan)
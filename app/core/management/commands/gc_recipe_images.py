@@ -0,0 +1,69 @@
+"""
+Django command to delete recipe image files no recipe references.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+
+
+UPLOAD_DIR = os.path.join('uploads', 'recipe')
+
+
+def file_stem(filename):
+    """Return the image stem of a stored image or rendition filename."""
+    return os.path.splitext(filename)[0].split('_', 1)[0]
+
+
+class Command(BaseCommand):
+    """Garbage collect unreferenced recipe images and renditions"""
+
+    help = 'Delete recipe images and renditions no recipe references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-minutes', type=int,
+            default=settings.RECIPE_IMAGE_GC_GRACE_MINUTES,
+            help='Keep files modified more recently, they may belong to '
+                 'an upload that is not committed yet.'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if not default_storage.exists(UPLOAD_DIR):
+            self.stdout.write('No recipe images stored.')
+            return
+
+        referenced = {
+            file_stem(os.path.basename(name))
+            for name in Recipe.objects.exclude(image='').exclude(
+                image__isnull=True
+            ).values_list('image', flat=True).iterator()
+        }
+        cutoff = time.time() - options['grace_minutes'] * 60
+
+        deleted = freed = 0
+        for filename in default_storage.listdir(UPLOAD_DIR)[1]:
+            if file_stem(filename) in referenced:
+                continue
+            path = default_storage.path(os.path.join(UPLOAD_DIR, filename))
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            if not options['dry_run']:
+                default_storage.delete(os.path.join(UPLOAD_DIR, filename))
+            deleted += 1
+            freed += stat.st_size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} unreferenced files, {freed} bytes.'
+        ))
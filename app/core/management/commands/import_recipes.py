@@ -0,0 +1,59 @@
+"""
+Django command to bulk import recipes from an NDJSON or CSV file.
+"""
+import json
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.importers import PARSERS, import_recipes
+
+
+class Command(BaseCommand):
+    """Import a user's recipes from a file"""
+
+    help = 'Create recipes for a user from an NDJSON or CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--email', required=True)
+        parser.add_argument(
+            '--format', choices=sorted(PARSERS),
+            help='File format, taken from the extension by default.'
+        )
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}.')
+
+        data_format = options['format'] or \
+            os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if data_format not in PARSERS:
+            raise CommandError(f'Unknown format {data_format!r}.')
+
+        created = failed = 0
+        start = time.perf_counter()
+        with open(options['path'], 'rb') as lines:
+            results = import_recipes(
+                user, PARSERS[data_format](lines), options['chunk_size']
+            )
+            for result in results:
+                if 'id' in result:
+                    created += 1
+                    continue
+                failed += 1
+                self.stderr.write(
+                    f'Line {result["line"]}: {json.dumps(result["errors"])}'
+                )
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} recipes, {failed} failed, in '
+            f'{elapsed:.2f}s ({created / elapsed:.0f} recipes/s).'
+        ))
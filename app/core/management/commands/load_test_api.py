@@ -0,0 +1,145 @@
+"""
+Django command to load test a running API server.
+"""
+import asyncio
+import statistics
+import time
+from collections import Counter
+from itertools import cycle
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+READ_PATHS = [
+    '/api/recipe/recipes/',
+    '/api/recipe/tags/',
+    '/api/recipe/ingredient/',
+]
+
+
+class Command(BaseCommand):
+    """Measure throughput and latency of the read endpoints.
+
+    To compare the uWSGI and ASGI modes at equal memory, deploy each with
+    the same APP_MEM_LIMIT and WEB_WORKERS, then run this against both
+    with the same token, paths and concurrency.
+    """
+
+    help = 'Send concurrent GET requests to a server, report req/s and ' \
+        'latency percentiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Server base URL, e.g. http://host')
+        parser.add_argument('--token', help='API token of the user.')
+        parser.add_argument(
+            '--paths', nargs='+', default=READ_PATHS,
+            help='Paths requested in turn, the recipe API reads by default.'
+        )
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--seconds', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise CommandError(f'Invalid server URL {options["url"]!r}.')
+
+        start = time.perf_counter()
+        latencies, statuses, errors = asyncio.run(self._run(url, options))
+        elapsed = time.perf_counter() - start
+        count = len(latencies)
+        self.stdout.write(
+            f'{count} requests in {elapsed:.1f}s, {count / elapsed:.1f} '
+            f'req/s, {errors} errors'
+        )
+        if count:
+            cuts = statistics.quantiles(latencies, n=100) \
+                if count > 1 else latencies * 99
+            self.stdout.write(
+                f'latency ms p50 {cuts[49]:.1f} p95 {cuts[94]:.1f} '
+                f'p99 {cuts[98]:.1f} max {max(latencies):.1f}'
+            )
+        self.stdout.write('status ' + ' '.join(
+            f'{code}:{total}' for code, total in sorted(statuses.items())
+        ))
+
+    async def _run(self, url, options):
+        """Run the clients and return latencies, statuses and errors."""
+        latencies = []
+        statuses = Counter()
+        errors = [0]
+        deadline = time.perf_counter() + options['seconds']
+        requests = [
+            self._request(url, path, options['token'])
+            for path in options['paths']
+        ]
+        await asyncio.gather(*[
+            self._client(url, cycle(requests[i:] + requests[:i]), deadline,
+                         latencies, statuses, errors)
+            for i in range(options['concurrency'])
+        ])
+        return latencies, statuses, errors[0]
+
+    def _request(self, url, path, token):
+        """Return the bytes of a keep-alive GET of path."""
+        lines = [
+            f'GET {url.path.rstrip("/")}{path} HTTP/1.1',
+            f'Host: {url.netloc}',
+            'Accept: application/json',
+            'Connection: keep-alive',
+        ]
+        if token:
+            lines.append(f'Authorization: Token {token}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin1')
+
+    async def _client(self, url, requests, deadline, latencies, statuses,
+                      errors):
+        """Send requests one after the other on a kept alive connection."""
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        writer = None
+        while time.perf_counter() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        url.hostname, port, ssl=url.scheme == 'https'
+                    )
+                start = time.perf_counter()
+                writer.write(next(requests))
+                status, keep_alive = await self._response(reader)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] += 1
+            except (OSError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError, ValueError):
+                errors[0] += 1
+                keep_alive = False
+            if not keep_alive and writer is not None:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    async def _response(self, reader):
+        """Read a response, return its status and if the connection stays
+        open."""
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin1').split('\r\n')
+        headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip().lower()
+
+        if 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if not size:
+                    break
+        else:
+            await reader.read()
+            return int(status_line.split()[1]), False
+        return int(status_line.split()[1]), \
+            headers.get('connection') != 'close'
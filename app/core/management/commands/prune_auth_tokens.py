@@ -0,0 +1,36 @@
+"""
+Django command to delete expired auth tokens.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Delete auth tokens past their expiry"""
+
+    help = 'Delete expired auth tokens, run it periodically e.g. from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Tokens deleted per statement, keeps locks short.'
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        now = timezone.now()
+        deleted = 0
+        while True:
+            batch = list(
+                AuthToken.objects.filter(expires_at__lte=now)
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            deleted += AuthToken.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired tokens.'
+        ))
@@ -0,0 +1,22 @@
+"""
+Django command to recompute the recipe counts of tags and ingredients.
+"""
+from django.core.management.base import BaseCommand
+
+from recipe.counts import recompute_recipe_counts
+from recipe.importers import ATTR_FIELDS
+
+
+class Command(BaseCommand):
+    """Fix recipe counts that drifted from the recipe links"""
+
+    help = 'Recompute the recipe counts of tags and ingredients from ' \
+        'their links and fix the ones that drifted.'
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        for field, model in ATTR_FIELDS.items():
+            fixed = recompute_recipe_counts(model, field)
+            self.stdout.write(self.style.SUCCESS(
+                f'Fixed the recipe count of {fixed} {field}.'
+            ))
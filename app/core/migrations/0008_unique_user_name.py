@@ -0,0 +1,74 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+def dedupe_names(apps, schema_editor):
+    """Merge tags and ingredients whose names differ only by case.
+
+    Recipes linked to a duplicate are relinked to the oldest row with the
+    same (user, lower(name)) and the duplicates are deleted.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for field in ('tags', 'ingredients'):
+        m2m = Recipe._meta.get_field(field)
+        table = m2m.related_model._meta.db_table
+        through = m2m.remote_field.through._meta.db_table
+        source = m2m.m2m_column_name()
+        target = m2m.m2m_reverse_name()
+        duplicates = f"""
+            SELECT id, keep_id FROM (
+                SELECT id, min(id) OVER (
+                    PARTITION BY user_id, lower(name)
+                ) AS keep_id
+                FROM {table}
+            ) ranked WHERE id <> keep_id
+        """
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {through} ({source}, {target})
+                SELECT link.{source}, dup.keep_id
+                FROM {through} link
+                JOIN ({duplicates}) dup ON dup.id = link.{target}
+                ON CONFLICT DO NOTHING
+            """)
+            cursor.execute(f"""
+                DELETE FROM {through}
+                WHERE {target} IN (SELECT id FROM ({duplicates}) dup)
+            """)
+            cursor.execute(f"""
+                DELETE FROM {table}
+                WHERE id IN (SELECT id FROM ({duplicates}) dup)
+            """)
+            # Fire the deferred FK checks now, indexes cannot be created
+            # on tables with pending trigger events.
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_names, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_lower_name_uniq '
+            'ON core_tag (user_id, lower(name))',
+            'DROP INDEX core_tag_user_lower_name_uniq',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingredient_user_lower_name_uniq '
+            'ON core_ingredient (user_id, lower(name))',
+            'DROP INDEX core_ingredient_user_lower_name_uniq',
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name'], name='core_ingredient_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='core_tag_user_name_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:11
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Same vector as recipe.search.search_vector(), for the existing rows.
+POPULATE_SEARCH_VECTOR = """
+    UPDATE core_recipe r SET search_vector =
+        setweight(to_tsvector('english', coalesce(r.title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ') FROM core_recipe_tags rt
+            JOIN core_tag t ON t.id = rt.tag_id WHERE rt.recipe_id = r.id
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ') FROM core_recipe_ingredients ri
+            JOIN core_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = r.id
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce(r.description, '')), 'C')
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_image_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(POPULATE_SEARCH_VECTOR, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:20
+
+from django.db import migrations
+
+
+TABLES = ('core_tag', 'core_ingredient')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Index lowercased names for trigram matching when pg_trgm exists.
+
+    Without the extension name suggestions only match prefixes.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in TABLES:
+            cursor.execute(
+                f'CREATE INDEX {table}_name_trgm_idx ON {table} '
+                f'USING gin (lower(name) gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX core_tag_user_name_prefix_idx '
+            'ON core_tag (user_id, lower(name) text_pattern_ops)',
+            'DROP INDEX core_tag_user_name_prefix_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_ingredient_user_name_prefix_idx '
+            'ON core_ingredient (user_id, lower(name) text_pattern_ops)',
+            'DROP INDEX core_ingredient_user_name_prefix_idx',
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+POPULATE_RECIPE_COUNT = '''
+UPDATE core_{model} SET recipe_count = (
+    SELECT count(*) FROM core_recipe_{field}
+    WHERE core_recipe_{field}.{model}_id = core_{model}.id
+)
+'''
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_name_suggest_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            POPULATE_RECIPE_COUNT.format(model='tag', field='tags'),
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            POPULATE_RECIPE_COUNT.format(
+                model='ingredient', field='ingredients'
+            ),
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name', 'id'], name='core_ingredient_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name', 'id'], name='core_tag_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'id'], name='core_tag_user_count_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_authtoken_tokens(apps, schema_editor):
+    """Store the tokens of rest_framework.authtoken as hashes.
+
+    Clients keep using their keys until the copies expire. The old table
+    is left in place, it can be dropped once nothing rolls back to it.
+    """
+    connection = schema_editor.connection
+    if 'authtoken_token' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO core_authtoken '
+            '(key_hash, user_id, created, expires_at) '
+            "SELECT encode(sha256(convert_to(key, 'UTF8')), 'hex'), "
+            'user_id, created, now() + %s FROM authtoken_token',
+            [settings.AUTH_TOKEN_TTL],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_hash', models.CharField(max_length=64, unique=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(
+            copy_authtoken_tokens, migrations.RunPython.noop
+        ),
+    ]
@@ -1,15 +1,22 @@
 """Contains database models"""
+import hashlib
+import secrets
 import uuid
 import os
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 
+from core.storage import ContentAddressedStorage
+
 
 def recipe_image_file_path(instance, filename):
     """Genetrates file path for new recipe image"""
@@ -54,8 +61,57 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class AuthToken(models.Model):
+    """API token of a user, stored as a hash of its key.
+
+    The key itself is only known to the client it was issued to.
+    """
+    key_hash = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='auth_tokens',
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @staticmethod
+    def hash_key(key):
+        """Return the stored hash of a token key.
+
+        Keys are random, so a fast hash is enough to keep them secret.
+        """
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """Create a token for user and return it with its key."""
+        key = secrets.token_hex(20)
+        token = cls.objects.create(
+            key_hash=cls.hash_key(key),
+            user=user,
+            expires_at=timezone.now() + settings.AUTH_TOKEN_TTL,
+        )
+        return token, key
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return f'{self.user} until {self.expires_at:%Y-%m-%d %H:%M}'
+
+
 class Recipe(models.Model):
     """Recipe model"""
+
+    class ImageStatus(models.TextChoices):
+        NONE = '', 'No image'
+        PENDING = 'pending', 'Pending'
+        PROCESSING = 'processing', 'Processing'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -67,30 +123,131 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Images are stored once per distinct content and shared by the
+    # recipes referencing them, see recipe.images.release_image().
+    image = models.ImageField(
+        null=True, upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage(), db_index=True
+    )
+    image_status = models.CharField(
+        max_length=20, blank=True,
+        choices=ImageStatus.choices, default=ImageStatus.NONE
+    )
+    image_renditions = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Title, tag, ingredient and description words for full text search,
+    # kept up to date by recipe.search.update_search_vectors().
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+            models.Index(
+                fields=['user', '-id'], name='core_recipe_user_id_desc_idx'
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx'
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='core_recipe_user_time_idx'
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='core_recipe_user_price_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Tag(models.Model):
+class RecipeAttr(models.Model):
+    """Base model for objects a user attaches to recipes"""
+    # Number of recipes linked, maintained by recipe.counts.
+    recipe_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """Save the object, leaving its recipe count as stored.
+
+        The count is only changed by recipe.counts, in SQL, so saving an
+        instance loaded before its links changed does not undo them.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'recipe_count'
+            ]
+        super().save(*args, **kwargs)
+
+
+class Tag(RecipeAttr):
     """Tag model for filtering recipes"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # (user_id, lower(name)) is also unique, see migration 0008, and
+        # indexed for name suggestions, see migration 0014.
+        indexes = [
+            models.Index(
+                fields=['user', 'name', 'id'], name='core_tag_user_name_idx'
+            ),
+            models.Index(
+                fields=['user', 'updated_at'], name='core_tag_user_updated_idx'
+            ),
+            models.Index(
+                fields=['user', 'name', 'id'], name='core_tag_assigned_idx',
+                condition=models.Q(recipe_count__gt=0),
+            ),
+            models.Index(
+                fields=['user', 'recipe_count', 'id'],
+                name='core_tag_user_count_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(RecipeAttr):
     """Ingredient model for recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
         )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # (user_id, lower(name)) is also unique, see migration 0008, and
+        # indexed for name suggestions, see migration 0014.
+        indexes = [
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='core_ingredient_user_name_idx'
+            ),
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_ingredient_user_upd_idx'
+            ),
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='core_ingredient_assigned_idx',
+                condition=models.Q(recipe_count__gt=0),
+            ),
+            models.Index(
+                fields=['user', 'recipe_count', 'id'],
+                name='core_ingredient_user_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
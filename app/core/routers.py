@@ -0,0 +1,126 @@
+"""
+Routing of reads to the read replicas
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+# The database the current request reads from, set by the views reading
+# from replicas. Being a context variable, it follows a request into the
+# threads serving it under ASGI.
+read_database = contextvars.ContextVar('read_database', default=None)
+
+# Seconds of WAL the replica has received but not replayed yet, 0 when it
+# replayed everything, whatever the time of the last replayed transaction.
+# A replica not streaming from the primary has no way to know what it
+# misses, its lag is NULL. The WAL receiver status is only shown to roles
+# with pg_read_all_stats, for others a running receiver counts as
+# streaming. A primary has no lag.
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver
+            WHERE pid IS NOT NULL
+            AND COALESCE(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+"""
+
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def replica_lag(alias):
+    """Return how many seconds the replica alias lags behind the primary,
+    infinity when it does not stream from the primary, or None when it
+    cannot be reached.
+
+    The lag is measured at most once per REPLICA_LAG_CHECK_SECONDS in each
+    process, the other requests meanwhile use the last measure. A replica
+    that could not be reached is only tried again after
+    REPLICA_RETRY_SECONDS, so requests do not keep waiting on its connect
+    timeout.
+    """
+    now = time.monotonic()
+    with _lags_lock:
+        checked_at, lag = _lags.get(alias, (None, None))
+        interval = settings.REPLICA_LAG_CHECK_SECONDS if lag is not None \
+            else settings.REPLICA_RETRY_SECONDS
+        if checked_at is not None and now - checked_at < interval:
+            return lag
+        _lags[alias] = (now, lag)
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            lag = cursor.fetchone()[0]
+        lag = float('inf') if lag is None else float(lag)
+    except DatabaseError:
+        logger.warning('Replica %s is unreachable', alias, exc_info=True)
+        connections[alias].close()
+        lag = None
+
+    with _lags_lock:
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """Return a replica lagging at most REPLICA_MAX_LAG_SECONDS, or the
+    primary when none does."""
+    replicas = []
+    for alias in settings.DATABASE_REPLICAS:
+        lag = replica_lag(alias)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS:
+            replicas.append(alias)
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def _pin_key(user_id):
+    """Return the cache key marking the user as pinned to the primary."""
+    return f'db:primary-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for REPLICA_PIN_SECONDS."""
+    cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    """Check whether the user wrote in the last REPLICA_PIN_SECONDS."""
+    return cache.get(_pin_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    """Read from the database of the request, write to the primary.
+
+    Reads go to the primary unless read_database is set, so only the
+    views choosing a replica ever read from one.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
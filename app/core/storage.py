@@ -0,0 +1,74 @@
+"""
+Content addressed file storage
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage keeping one copy of each distinct content.
+
+    A saved file is named by the SHA-256 digest of its content, computed
+    while it is written, in the directory and with the extension of the
+    requested name. Saving content that is already stored returns the
+    existing name without writing it again.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen by _save() from the content.
+        return name
+
+    def digest_name(self, name, digest):
+        """Return the name content with digest is stored under."""
+        dirname, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(dirname, f'{digest}{ext}')
+
+    def create_temp(self, name):
+        """Open a new temporary file next to name for writing.
+
+        Returns its storage name and the open file. Temporary names start
+        with a dot and are never returned by save().
+        """
+        dirname = os.path.dirname(name)
+        temp_name = os.path.join(dirname, f'.upload-{uuid.uuid4()}')
+        path = self.path(temp_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return temp_name, open(path, 'xb+')
+
+    def commit_temp(self, temp_name, name, digest):
+        """Move a fully written temporary file to its digest name.
+
+        When that content is already stored the temporary file is dropped
+        and the stored copy kept. Returns the digest name.
+        """
+        final_name = self.digest_name(name, digest)
+        final_path = self.path(final_name)
+        if os.path.exists(final_path):
+            self.delete(temp_name)
+            # Mark the blob as in use for the garbage collection grace.
+            os.utime(final_path)
+        else:
+            # Same directory, so this is an atomic rename.
+            os.replace(self.path(temp_name), final_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(final_path, self.file_permissions_mode)
+        return final_name
+
+    def _save(self, name, content):
+        temp_name, temp_file = self.create_temp(name)
+        sha = hashlib.sha256()
+        try:
+            with temp_file:
+                for chunk in content.chunks():
+                    sha.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            self.delete(temp_name)
+            raise
+        return self.commit_temp(temp_name, name, sha.hexdigest())
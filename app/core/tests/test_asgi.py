@@ -0,0 +1,125 @@
+"""
+Tests for serving the API under ASGI
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TransactionTestCase, override_settings
+from django.urls import path
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.asgi import async_view, get_asgi_application, serve_async
+from core.models import AuthToken, Recipe
+from recipe.views import RecipeViewSet
+
+
+def create_recipe(user, title='Sample recipe'):
+    """Create and return a recipe of user"""
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=5, price=1
+    )
+
+
+# The pool threads outlive the tests, their connections must not persist
+# or the test database cannot be dropped.
+@patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 0})
+class AsyncViewTests(TransactionTestCase):
+    """Test sync views served as async views"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        self.factory = APIRequestFactory()
+
+    def test_view_runs_in_pool(self):
+        """Test the wrapped view is async and runs on a pool thread"""
+        threads = []
+
+        def view(request):
+            threads.append(threading.current_thread().name)
+            return HttpResponse('ok')
+
+        wrapped = async_view(view)
+        res = async_to_sync(wrapped)(self.factory.get('/'))
+
+        self.assertTrue(asyncio.iscoroutinefunction(wrapped))
+        self.assertEqual(res.content, b'ok')
+        self.assertTrue(threads[0].startswith('asgi-view'))
+
+    def test_recipe_list_rendered_in_pool(self):
+        """Test the recipe list is queried and rendered by the async view"""
+        create_recipe(self.user)
+        request = self.factory.get('/api/recipe/recipes/')
+        force_authenticate(request, self.user)
+        view = async_view(RecipeViewSet.as_view({'get': 'list'}))
+
+        res = async_to_sync(view)(request)
+
+        self.assertTrue(res.is_rendered)
+        self.assertIn(b'Sample recipe', res.content)
+
+    def test_serve_async_only_in_asgi_mode(self):
+        """Test url pattern views become async only in ASGI mode"""
+        def view(request):
+            return HttpResponse('ok')
+
+        sync_patterns = serve_async([path('', view)])
+        with override_settings(SERVER_MODE='asgi'):
+            async_patterns = serve_async([path('', view)])
+
+        self.assertIs(sync_patterns[0].callback, view)
+        self.assertTrue(
+            asyncio.iscoroutinefunction(async_patterns[0].callback)
+        )
+
+
+class ASGIHandlerTests(TransactionTestCase):
+    """Test the ASGI application"""
+
+    def request(self, url, headers=()):
+        """Send a GET of url to the application, return the messages sent"""
+        application = get_asgi_application()
+        messages = []
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': url,
+            'query_string': b'',
+            'headers': [(b'host', b'testserver'), *headers],
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+        return messages
+
+    def test_export_streams_off_event_loop(self):
+        """Test the export, which reads the database as it streams, works"""
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        create_recipe(user, 'First recipe')
+        create_recipe(user, 'Second recipe')
+        _, key = AuthToken.issue(user)
+
+        messages = self.request('/api/recipe/recipes/export/', [
+            (b'authorization', f'Token {key}'.encode()),
+        ])
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(b'First recipe', body)
+        self.assertIn(b'Second recipe', body)
+        self.assertFalse(messages[-1].get('more_body', False))
@@ -1,13 +1,31 @@
 """
 Tests custom django commands
 """
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as psycopg2Error
 
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    LiveServerTestCase,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from core.models import AuthToken, Recipe, Tag, Ingredient
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +50,200 @@ class CommandTest(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkCommandTest(TestCase):
+    """Test the recipe query benchmark command"""
+
+    def test_benchmark_recipe_queries(self):
+        """Test benchmark seeds data and reports every plan"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipe_queries', recipes=20, tags=5, runs=1,
+            stdout=out,
+        )
+
+        self.assertEqual(Recipe.objects.count(), 20)
+        self.assertIn('join + distinct', out.getvalue())
+        self.assertIn('exists (all)', out.getvalue())
+
+
+class GCRecipeImagesCommandTest(TestCase):
+    """Test the recipe image garbage collection command"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Recipe', time_minutes=5, price='1.00'
+        )
+        self.recipe.image.save('photo.jpg', ContentFile(b'referenced'))
+
+    def store(self, name, age_minutes):
+        """Store a file under the upload dir, modified age_minutes ago"""
+        name = default_storage.save(
+            os.path.join('uploads', 'recipe', name), ContentFile(b'data')
+        )
+        mtime = time.time() - age_minutes * 60
+        os.utime(default_storage.path(name), (mtime, mtime))
+        return name
+
+    def test_gc_deletes_only_old_unreferenced_files(self):
+        """Test unreferenced files past the grace period are deleted"""
+        stem = os.path.splitext(self.recipe.image.name)[0]
+        rendition = self.store(f'{os.path.basename(stem)}_thumb.webp', 120)
+        orphan = self.store('orphan.jpg', 120)
+        orphan_rendition = self.store('orphan_thumb.webp', 120)
+        fresh = self.store('fresh.jpg', 5)
+        out = StringIO()
+
+        call_command('gc_recipe_images', stdout=out)
+
+        self.assertTrue(default_storage.exists(self.recipe.image.name))
+        self.assertTrue(default_storage.exists(rendition))
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(orphan_rendition))
+        self.assertIn('Deleted 2 unreferenced files', out.getvalue())
+
+
+class ImportRecipesCommandTest(TestCase):
+    """Test the recipe import command"""
+
+    def test_import_recipes(self):
+        """Test recipes are imported from a file and errors reported"""
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as data:
+            data.write(
+                'title,time_minutes,price,tags\n'
+                'Curry,30,5.00,Vegan;Spicy\n'
+                ',10,1.00,\n'
+            )
+            data.flush()
+            out, err = StringIO(), StringIO()
+
+            call_command(
+                'import_recipes', data.name, email=user.email,
+                stdout=out, stderr=err,
+            )
+
+        self.assertEqual(Recipe.objects.filter(user=user).count(), 1)
+        self.assertIn('Imported 1 recipes, 1 failed', out.getvalue())
+        self.assertIn('Line 3', err.getvalue())
+
+
+class RecomputeRecipeCountsCommandTest(TestCase):
+    """Test the recipe count recompute command"""
+
+    def test_recompute_recipe_counts(self):
+        """Test drifted counts are set back to the number of links"""
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        recipe = Recipe.objects.create(
+            user=user, title='Curry', time_minutes=30, price='5.00'
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe.tags.add(tag)
+        Tag.objects.filter(pk=tag.pk).update(recipe_count=7)
+        ingredient = Ingredient.objects.create(user=user, name='Rice')
+        Ingredient.objects.filter(pk=ingredient.pk).update(recipe_count=2)
+        out = StringIO()
+
+        call_command('recompute_recipe_counts', stdout=out)
+
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(ingredient.recipe_count, 0)
+        self.assertIn('Fixed the recipe count of 1 tags', out.getvalue())
+        self.assertIn('Fixed the recipe count of 1 ingredients',
+                      out.getvalue())
+
+
+class BenchmarkLoginCommandTest(SimpleTestCase):
+    """Test the login benchmark command"""
+
+    def test_benchmark_login(self):
+        """Test a rate is reported for each hasher"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_login', hashers=['pbkdf2_sha256', 'scrypt'],
+            seconds=0.01, threads=2, stdout=out,
+        )
+
+        self.assertRegex(out.getvalue(), r'pbkdf2_sha256 +[\d.]+ logins/s')
+        self.assertRegex(out.getvalue(), r'scrypt +[\d.]+ logins/s')
+
+
+class PruneAuthTokensCommandTest(TestCase):
+    """Test the auth token pruning command"""
+
+    def test_prune_auth_tokens(self):
+        """Test only expired tokens are deleted, in batches"""
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        for _ in range(3):
+            AuthToken.issue(user)
+        AuthToken.objects.update(expires_at=timezone.now())
+        live, _ = AuthToken.issue(user)
+        out = StringIO()
+
+        call_command('prune_auth_tokens', batch_size=2, stdout=out)
+
+        self.assertEqual(list(AuthToken.objects.all()), [live])
+        self.assertIn('Deleted 3 expired tokens', out.getvalue())
+
+
+class BenchmarkDBConnectionsCommandTest(TransactionTestCase):
+    """Test the database connection benchmark command"""
+
+    def test_benchmark_db_connections(self):
+        """Test each mode is timed and the settings are restored"""
+        settings_dict = dict(connection.settings_dict)
+        out = StringIO()
+
+        call_command('benchmark_db_connections', requests=3, stdout=out)
+
+        for mode in ('new connection', 'persistent', 'persistent, checked'):
+            self.assertRegex(out.getvalue(), mode + r' +[\d.]+ ms')
+        self.assertIn('Persistent connections save', out.getvalue())
+        self.assertEqual(connection.settings_dict, settings_dict)
+
+
+class LoadTestAPICommandTest(LiveServerTestCase):
+    """Test the API load test command"""
+
+    # Django 3.2 does not close the connections of the live server threads,
+    # persistent ones would keep the test database from being dropped.
+    @patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 0})
+    def test_load_test_api(self):
+        """Test requests are counted and timed against a live server"""
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        Recipe.objects.create(
+            user=user, title='Sample', time_minutes=5, price=1
+        )
+        _, key = AuthToken.issue(user)
+        out = StringIO()
+
+        call_command(
+            'load_test_api', self.live_server_url, token=key,
+            concurrency=2, seconds=0.5, stdout=out,
+        )
+
+        self.assertRegex(out.getvalue(), r'[1-9]\d* requests in .* 0 errors')
+        self.assertRegex(out.getvalue(), r'latency ms p50 [\d.]+')
+        self.assertRegex(out.getvalue(), r'status 200:\d+$')
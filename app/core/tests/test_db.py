@@ -0,0 +1,81 @@
+"""
+Tests for the database backend
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, transaction
+from django.db.utils import InterfaceError
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Recipe
+
+
+def declares_cursor(func):
+    """Run func and return whether it declared a server side cursor"""
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return any(q['sql'].startswith('DECLARE') for q in queries)
+
+
+@patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 600})
+class PersistentConnectionTests(TransactionTestCase):
+    """Test persistent connections are checked before reuse"""
+
+    def setUp(self):
+        connection.close()
+
+    def break_connection(self):
+        """Use the connection in a request, then drop it unseen"""
+        close_old_connections()
+        Recipe.objects.exists()
+        close_old_connections()
+        connection.connection.close()
+        close_old_connections()
+
+    @patch.dict(connection.settings_dict, {'CONN_HEALTH_CHECKS': True})
+    def test_broken_connection_replaced(self):
+        """Test a dropped connection is replaced on the next request"""
+        self.break_connection()
+
+        self.assertFalse(Recipe.objects.exists())
+        self.assertTrue(connection.is_usable())
+
+    @patch.dict(connection.settings_dict, {'CONN_HEALTH_CHECKS': False})
+    def test_broken_connection_without_health_checks(self):
+        """Test a dropped connection fails without health checks"""
+        self.break_connection()
+
+        with self.assertRaises(InterfaceError):
+            Recipe.objects.exists()
+        connection.close()
+
+
+class TransactionPoolingTests(TransactionTestCase):
+    """Test server side cursors behind a transaction pooler"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        Recipe.objects.create(
+            user=user, title='Sample', time_minutes=5, price=1
+        )
+
+    def read_in_chunks(self):
+        return list(Recipe.objects.iterator())
+
+    def read_in_transaction(self):
+        with transaction.atomic():
+            return self.read_in_chunks()
+
+    def test_server_side_cursors_by_default(self):
+        """Test chunked reads use server side cursors without pooling"""
+        self.assertTrue(declares_cursor(self.read_in_chunks))
+
+    @patch.dict(connection.settings_dict, {'TRANSACTION_POOLING': True})
+    def test_server_side_cursors_only_in_transactions(self):
+        """Test pooled connections use server side cursors in transactions"""
+        self.assertFalse(declares_cursor(self.read_in_chunks))
+        self.assertTrue(declares_cursor(self.read_in_transaction))
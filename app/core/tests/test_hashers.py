@@ -0,0 +1,57 @@
+"""
+Tests for the password hashers
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+from django.test import SimpleTestCase, override_settings
+
+from core.hashers import ScryptPasswordHasher
+
+
+class ScryptPasswordHasherTests(SimpleTestCase):
+    """Test the scrypt password hasher"""
+
+    def test_hash_and_verify(self):
+        """Test passwords are hashed with the configured work factor"""
+        encoded = make_password('lètmein', 'seasalt', 'scrypt')
+
+        self.assertTrue(encoded.startswith(
+            f'scrypt${settings.SCRYPT_WORK_FACTOR}$seasalt$8$1$'
+        ))
+        self.assertTrue(check_password('lètmein', encoded))
+        self.assertFalse(check_password('lètmeinz', encoded))
+        self.assertEqual(identify_hasher(encoded).algorithm, 'scrypt')
+
+    def test_must_update_other_parameters(self):
+        """Test hashes with another work factor are upgraded"""
+        hasher = ScryptPasswordHasher()
+        encoded = hasher.encode('lètmein', 'seasalt', n=2 ** 10)
+
+        self.assertTrue(hasher.verify('lètmein', encoded))
+        self.assertTrue(hasher.must_update(encoded))
+        self.assertFalse(hasher.must_update(hasher.encode('x', 'seasalt')))
+
+    def test_high_work_factor(self):
+        """Test work factors above OpenSSL's default memory limit work"""
+        hasher = ScryptPasswordHasher()
+        encoded = hasher.encode('lètmein', 'seasalt', n=2 ** 15)
+
+        self.assertTrue(hasher.verify('lètmein', encoded))
+
+    @override_settings(PASSWORD_HASHERS=[
+        'core.hashers.ScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_pbkdf2_rehashed_on_check(self):
+        """Test a PBKDF2 hash is replaced with the preferred hasher"""
+        encoded = make_password('lètmein', hasher='pbkdf2_sha256')
+        upgraded = []
+
+        self.assertTrue(check_password('lètmein', encoded, upgraded.append))
+        self.assertEqual(upgraded, ['lètmein'])
+        self.assertEqual(get_hasher().algorithm, 'scrypt')
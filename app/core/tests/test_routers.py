@@ -0,0 +1,150 @@
+"""
+Tests for routing reads to read replicas
+"""
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import routers
+from core.models import Recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@contextmanager
+def replica_database(alias='replica_0', **settings_dict):
+    """Add alias as a second connection to the test database, used as the
+    only replica"""
+    connections.settings[alias] = {
+        **connections.settings['default'], **settings_dict,
+    }
+    try:
+        with override_settings(DATABASE_REPLICAS=[alias]):
+            yield connections[alias]
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+        routers._lags.clear()
+
+
+class ReplicaLagTests(TransactionTestCase):
+    """Test measuring the lag of replicas"""
+
+    def test_lag_of_caught_up_database(self):
+        """Test a database not replaying WAL has no lag"""
+        with replica_database():
+            self.assertEqual(routers.replica_lag('replica_0'), 0)
+            self.assertEqual(routers.choose_replica(), 'replica_0')
+
+    def test_lag_checked_once_per_interval(self):
+        """Test the lag is measured again only after the check interval"""
+        with replica_database() as replica, \
+                CaptureQueriesContext(replica) as queries:
+            routers.replica_lag('replica_0')
+            routers.replica_lag('replica_0')
+            with override_settings(REPLICA_LAG_CHECK_SECONDS=0):
+                routers.replica_lag('replica_0')
+
+        self.assertEqual(len(queries), 2)
+
+    def test_unreachable_replica_skipped(self):
+        """Test reads go to the primary when the replica is down"""
+        with replica_database(PORT='1'), \
+                self.assertLogs('core.routers', 'WARNING'):
+            self.assertIsNone(routers.replica_lag('replica_0'))
+            self.assertEqual(routers.choose_replica(), 'default')
+
+    def test_unreachable_replica_retried_after_backoff(self):
+        """Test a replica that was down is only tried again after the
+        retry interval"""
+        with replica_database(PORT='1'), \
+                override_settings(REPLICA_LAG_CHECK_SECONDS=0), \
+                self.assertLogs('core.routers', 'WARNING') as logs:
+            routers.replica_lag('replica_0')
+            routers.replica_lag('replica_0')
+            with override_settings(REPLICA_RETRY_SECONDS=0):
+                routers.replica_lag('replica_0')
+
+        self.assertEqual(len(logs.records), 2)
+
+    @patch('core.routers.LAG_QUERY', 'SELECT NULL')
+    def test_replica_not_streaming_skipped(self):
+        """Test reads go to the primary when the replica lost its primary"""
+        with replica_database():
+            self.assertEqual(routers.replica_lag('replica_0'), float('inf'))
+            self.assertEqual(routers.choose_replica(), 'default')
+
+    @patch('core.routers.replica_lag', return_value=6.0)
+    def test_lagging_replica_skipped(self, patched_lag):
+        """Test reads go to the primary when the replica lags too much"""
+        with replica_database(), \
+                override_settings(REPLICA_MAX_LAG_SECONDS=5):
+            self.assertEqual(routers.choose_replica(), 'default')
+
+        patched_lag.assert_called_once_with('replica_0')
+
+
+class ReplicaReadsApiTests(TransactionTestCase):
+    """Test the recipe API reads from replicas"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_safe_requests_read_replica(self):
+        """Test lists are read from the replica"""
+        Recipe.objects.create(
+            user=self.user, title='Sample', time_minutes=5, price=1
+        )
+
+        with replica_database() as replica, \
+                CaptureQueriesContext(replica) as queries:
+            recipes = self.client.get(RECIPES_URL)
+            tags = self.client.get(TAGS_URL)
+
+        self.assertEqual(recipes.status_code, status.HTTP_200_OK)
+        self.assertEqual(recipes.data['results'][0]['title'], 'Sample')
+        self.assertEqual(tags.status_code, status.HTTP_200_OK)
+        self.assertIn('core_recipe', queries[1]['sql'])
+        self.assertTrue(any('core_tag' in q['sql'] for q in queries))
+
+    def test_reads_after_write_use_primary(self):
+        """Test the user's reads stay on the primary after a write"""
+        with replica_database() as replica, \
+                CaptureQueriesContext(replica) as queries:
+            res = self.client.post(RECIPES_URL, {
+                'title': 'Sample', 'time_minutes': 5, 'price': '1.00',
+            })
+            recipes = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(recipes.data['results'][0]['title'], 'Sample')
+        self.assertEqual(len(queries), 0)
+
+    def test_pin_expires(self):
+        """Test reads go back to the replica once the pin expires"""
+        with replica_database() as replica, \
+                override_settings(REPLICA_PIN_SECONDS=0), \
+                CaptureQueriesContext(replica) as queries:
+            self.client.post(RECIPES_URL, {
+                'title': 'Sample', 'time_minutes': 5, 'price': '1.00',
+            })
+            self.client.get(RECIPES_URL)
+
+        self.assertGreater(len(queries), 0)
@@ -0,0 +1,137 @@
+"""
+Per-user response cache for recipe APIs
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils.http import parse_etags, quote_etag
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _version_key(user_id):
+    """Return the cache key holding the user's cache version."""
+    return f'recipe-api:version:{user_id}'
+
+
+def get_user_version(user_id):
+    """Return the current cache version of the user."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never goes back to a
+        # version that may still have responses cached under it.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_user_version(user_id):
+    """Move the user to a new cache version."""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        get_user_version(user_id)
+
+
+def invalidate_user(user_id):
+    """Invalidate every cached response of the user.
+
+    When called inside a transaction the version is bumped again on
+    commit, so responses cached by concurrent readers before the new data
+    was visible are not served afterwards.
+    """
+    _bump_user_version(user_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump_user_version(user_id))
+
+
+def response_cache_key(request, view):
+    """Return the cache key of the response to request on view.
+
+    Under etag_per_user the key includes the ETag, whose change marker
+    also catches writes made outside the API, which do not bump the
+    version, so the cached body always matches the ETag sent with it.
+    """
+    user_id = request.user.pk
+    url = request.build_absolute_uri()
+    etag = getattr(view, 'response_etag', '')
+    digest = hashlib.md5(
+        f'{view.basename}:{view.action}:{url}:{etag}'.encode()
+    ).hexdigest()
+    return f'recipe-api:response:{user_id}:{get_user_version(user_id)}:' \
+        f'{digest}'
+
+
+def cache_per_user(view_method):
+    """Cache successful responses of a viewset action per user.
+
+    Entries are keyed by the user's cache version and the full request
+    URL, so they are dropped by invalidate_user() and never shared
+    between users or query params.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = response_cache_key(request, self)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
+
+
+def response_etag(request, view):
+    """Return a strong ETag for the response to request on view.
+
+    It is derived from the user's cache version, which every API write
+    bumps, and the latest updated_at and row count of the user's objects,
+    which also catch writes made outside the API.
+    """
+    marker = view.queryset.model.objects.filter(
+        user=request.user
+    ).aggregate(updated=Max('updated_at'), count=Count('id'))
+    version = get_user_version(request.user.pk)
+    url = request.build_absolute_uri()
+    return quote_etag(hashlib.md5(
+        f'{view.basename}:{view.action}:{url}:{version}:'
+        f'{marker["updated"]}:{marker["count"]}'.encode()
+    ).hexdigest())
+
+
+def etag_per_user(view_method):
+    """Answer conditional GETs of a viewset action with ETags.
+
+    A request whose If-None-Match holds the current ETag gets an empty
+    304 Not Modified without running the action or serializing anything.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        etag = response_etag(request, self)
+        self.response_etag = etag
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # If-None-Match uses the weak comparison, ignore W/ prefixes.
+            etags = [e[2:] if e.startswith('W/') else e
+                     for e in parse_etags(if_none_match)]
+            if '*' in etags or etag in etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    return wrapper
@@ -0,0 +1,62 @@
+"""
+Denormalized recipe counts of tags and ingredients
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import (
+    Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce, Now
+
+from core.models import Recipe
+
+
+def adjust_recipe_counts(model, deltas):
+    """Add deltas, a mapping of pk to a change, to the recipe counts.
+
+    Rows are grouped by change and updated with a single UPDATE, so
+    linking a batch of recipes costs one statement whatever its size. The
+    counter is incremented in SQL, so concurrent adjustments of the same
+    row never lose updates.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+    if not by_delta:
+        return
+    change = Case(
+        *[When(pk__in=pks, then=Value(delta))
+          for delta, pks in by_delta.items()],
+        output_field=IntegerField(),
+    )
+    model.objects.filter(
+        pk__in=[pk for pks in by_delta.values() for pk in pks]
+    ).update(recipe_count=F('recipe_count') + change, updated_at=Now())
+
+
+def linked_counts(through, column, filters):
+    """Return how many rows of through match filters, per column value."""
+    return Counter(dict(
+        through.objects.filter(**filters).values(column)
+        .annotate(links=Count('pk')).values_list(column, 'links')
+    ))
+
+
+def recompute_recipe_counts(model, field):
+    """Set the recipe count of every row of model whose count drifted from
+    its links through Recipe.<field>, and return how many were fixed."""
+    m2m = Recipe._meta.get_field(field)
+    through = m2m.remote_field.through
+    target = m2m.m2m_reverse_name()
+    actual = Coalesce(
+        Subquery(
+            through.objects.filter(**{target: OuterRef('pk')})
+            .values(target).annotate(links=Count('pk')).values('links'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+    return model.objects.annotate(actual=actual).filter(
+        ~Q(recipe_count=F('actual'))
+    ).update(recipe_count=actual, updated_at=Now())
@@ -0,0 +1,88 @@
+"""
+Streaming export of recipes as NDJSON and CSV
+"""
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from core.models import Recipe
+from recipe.importers import ATTR_FIELDS, CSV_LIST_SEPARATOR
+from recipe.serializers import recipe_through
+
+
+EXPORT_FIELDS = [
+    'id', 'title', 'time_minutes', 'price', 'link', 'description',
+]
+COLUMNS = EXPORT_FIELDS + list(ATTR_FIELDS)
+
+
+def _attr_names(field, recipe_ids):
+    """Map each of recipe_ids to its attribute names, in one query."""
+    through, source, _ = recipe_through(field)
+    lookup = f'{Recipe._meta.get_field(field).m2m_reverse_field_name()}__name'
+    names = {pk: [] for pk in recipe_ids}
+    rows = through.objects.filter(**{f'{source}__in': recipe_ids}) \
+        .values_list(source, lookup).order_by(source, lookup)
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+    return names
+
+
+def iter_recipes(user, chunk_size=None):
+    """Yield a dict per recipe of user, with its tag and ingredient names.
+
+    Recipes are read through a server side cursor a chunk at a time, and
+    the names of each chunk are fetched with one query per relation, so
+    memory does not grow with the number of recipes. The cursor lives in
+    a transaction, so it is not materialized on commit and stays on one
+    server connection behind a transaction pooler.
+    """
+    chunk_size = chunk_size or settings.RECIPE_EXPORT_CHUNK_SIZE
+    with transaction.atomic():
+        rows = Recipe.objects.filter(user=user).order_by('id') \
+            .values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            ids = [row[0] for row in chunk]
+            attrs = {field: _attr_names(field, ids) for field in ATTR_FIELDS}
+            for row in chunk:
+                recipe = dict(zip(EXPORT_FIELDS, row))
+                for field in ATTR_FIELDS:
+                    recipe[field] = attrs[field][recipe['id']]
+                yield recipe
+
+
+def ndjson_lines(recipes):
+    """Yield each recipe as a line of JSON."""
+    for recipe in recipes:
+        yield json.dumps(recipe, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object returning what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(recipes):
+    """Yield a header and a CSV line per recipe, in the import format."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for recipe in recipes:
+        for field in ATTR_FIELDS:
+            recipe[field] = CSV_LIST_SEPARATOR.join(recipe[field])
+        yield writer.writerow([recipe[column] for column in COLUMNS])
+
+
+WRITERS = {
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+}
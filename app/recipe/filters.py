@@ -0,0 +1,200 @@
+"""
+Filter backends for recipe APIs
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchRank
+from django.db.models import Exists, F, FloatField, OuterRef
+from django.db.models.functions import Cast
+
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from recipe.search import search_query
+
+
+def params_to_ints(param, value):
+    """Convert a comma separated query param to a list of integers."""
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError(
+            {param: 'Expected a comma separated list of integer IDs.'}
+        )
+
+
+class RecipeAttrFilter(BaseFilterBackend):
+    """Filter recipes by tag and ingredient IDs.
+
+    Each ``?<relation>=`` param matches recipes linked to "any" (default)
+    or "all" of the given IDs, chosen with ``?<relation>_mode=``. Matches
+    are tested with correlated EXISTS subqueries on the through table so
+    the recipe rows are never multiplied and need no DISTINCT.
+    """
+    relations = ('tags', 'ingredients')
+    modes = ('any', 'all')
+
+    def filter_queryset(self, request, queryset, view):
+        for relation in self.relations:
+            value = request.query_params.get(relation)
+            if not value:
+                continue
+            mode = request.query_params.get(f'{relation}_mode', 'any')
+            if mode not in self.modes:
+                raise ValidationError(
+                    {f'{relation}_mode': f'Must be one of {self.modes}.'}
+                )
+            ids = params_to_ints(relation, value)
+            queryset = self.filter_relation(queryset, relation, ids, mode)
+
+        return queryset
+
+    def filter_relation(self, queryset, relation, ids, mode='any'):
+        """Restrict queryset to rows linked to any or all of ids."""
+        field = queryset.model._meta.get_field(relation)
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        links = through.objects.filter(**{source: OuterRef('pk')})
+
+        if mode == 'any':
+            return queryset.filter(
+                Exists(links.filter(**{f'{target}__in': ids}))
+            )
+
+        for attr_id in set(ids):
+            queryset = queryset.filter(
+                Exists(links.filter(**{target: attr_id}))
+            )
+        return queryset
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Full text search of recipes with ``?q=``, best matches first.
+
+    Matches are found through the GIN index on the stored search vector
+    and annotated with their ts_rank, which RecipeOrderingFilter sorts by.
+    The rank is cast from real to double precision, so the value a page
+    cursor stores compares equal to the rank it came from.
+    """
+    search_param = 'q'
+
+    def get_search_text(self, request):
+        """Return the stripped search text of the request."""
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        if not text:
+            return queryset
+        return self.search(queryset, text)
+
+    def search(self, queryset, text):
+        """Restrict queryset to matches of text, annotated with rank.
+
+        Only the newest RECIPE_SEARCH_MAX_RANKED matches are ranked, read
+        backwards from the (user, id) index, so a word found in most
+        recipes does not rank all of them to return one page. The other
+        filters must come first to narrow the matches before the cap.
+        """
+        query = search_query(text)
+        candidates = queryset.filter(search_vector=query).order_by('-id')
+        return queryset.filter(
+            pk__in=candidates.values('pk')[:settings.RECIPE_SEARCH_MAX_RANKED]
+        ).annotate(
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
+
+
+class RecipeRangeFilter(BaseFilterBackend):
+    """Filter recipes by ranges of cooking time and price.
+
+    Each of ``?<field>__gte=`` and ``?<field>__lte=`` bounds the field
+    inclusively. Values are validated by the serializer field of the same
+    type, so a malformed bound gets a 400 naming the param.
+    """
+    range_fields = {
+        'time_minutes': serializers.IntegerField(min_value=0),
+        'price': serializers.DecimalField(
+            max_digits=5, decimal_places=2, min_value=0
+        ),
+    }
+    lookups = ('gte', 'lte')
+
+    def filter_queryset(self, request, queryset, view):
+        bounds, errors = {}, {}
+        for field, parser in self.range_fields.items():
+            for lookup in self.lookups:
+                param = f'{field}__{lookup}'
+                value = request.query_params.get(param)
+                if value is None:
+                    continue
+                try:
+                    bounds[param] = parser.run_validation(value)
+                except ValidationError as exc:
+                    errors[param] = exc.detail
+        if errors:
+            raise ValidationError(errors)
+        return queryset.filter(**bounds)
+
+
+class FieldOrderingFilter(BaseFilterBackend):
+    """Order results with ``?ordering=`` by one of ``ordering_fields``,
+    descending when prefixed with "-".
+
+    The id breaks ties so the cursor pagination, which takes its ordering
+    from here, stays stable. Without the param the default ordering
+    applies, the pagination's own unless overridden.
+    """
+    ordering_param = 'ordering'
+    ordering_fields = ()
+
+    def get_default_ordering(self, request, view):
+        """Return the ordering used when the request asks for none."""
+        ordering = view.pagination_class.ordering
+        return (ordering,) if isinstance(ordering, str) else ordering
+
+    def get_ordering(self, request, queryset, view):
+        value = request.query_params.get(self.ordering_param)
+        if not value:
+            return self.get_default_ordering(request, view)
+        field = value[1:] if value.startswith('-') else value
+        if field not in self.ordering_fields:
+            raise ValidationError({
+                self.ordering_param:
+                    f'Must be one of {self.ordering_fields}, optionally '
+                    f'prefixed with "-".'
+            })
+        if field == 'id':
+            return (value,)
+        return (value, '-id' if value.startswith('-') else 'id')
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.order_by(
+            *self.get_ordering(request, queryset, view)
+        )
+
+
+class RecipeOrderingFilter(FieldOrderingFilter):
+    """Order recipes by id, cooking time or price.
+
+    Each ordering is read from a (user, <field>, id) index. Without
+    ``?ordering=`` searches are sorted by rank, best first, and other
+    lists newest first. It must come after RecipeSearchFilter, which
+    annotates the rank.
+    """
+    ordering_fields = ('id', 'time_minutes', 'price')
+
+    def get_default_ordering(self, request, view):
+        if RecipeSearchFilter().get_search_text(request):
+            return ('-rank', '-id')
+        return super().get_default_ordering(request, view)
+
+
+class RecipeAttrOrderingFilter(FieldOrderingFilter):
+    """Order tags and ingredients by name or by popularity.
+
+    Sorting by the denormalized recipe count, most used first with
+    ``-recipe_count``, reads the (user, recipe_count, id) index.
+    """
+    ordering_fields = ('name', 'recipe_count')
@@ -0,0 +1,223 @@
+"""
+Background processing of uploaded recipe images
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.cache import invalidate_user
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the image worker pool, created on first use.
+
+    Creating it lazily keeps the threads out of the uWSGI master, they
+    would not survive the fork into the workers.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-image',
+            )
+    return _executor
+
+
+def schedule_image_processing(recipe):
+    """Mark the recipe image pending and render it in the worker pool
+    once the current transaction commits."""
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_status=Recipe.ImageStatus.PENDING,
+        image_renditions={},
+        updated_at=timezone.now(),
+    )
+    recipe.image_status = Recipe.ImageStatus.PENDING
+    recipe.image_renditions = {}
+
+    args = (recipe.pk, recipe.user_id, recipe.image.name)
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_worker, *args)
+    )
+
+
+def _run_in_worker(*args):
+    """Process an image on a worker thread and release its connection."""
+    try:
+        process_recipe_image(*args)
+    finally:
+        connection.close()
+
+
+def _set_status(recipe_id, image_name, status, **fields):
+    """Update the status while the recipe still has image_name."""
+    return Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_status=status, updated_at=timezone.now(), **fields
+    )
+
+
+def process_recipe_image(recipe_id, user_id, image_name):
+    """Render the renditions of a recipe image and record them.
+
+    Nothing is done if the recipe's image was replaced in the meantime,
+    the newer upload has its own job.
+    """
+    try:
+        if not _set_status(
+            recipe_id, image_name, Recipe.ImageStatus.PROCESSING
+        ):
+            return
+        renditions = render_renditions(image_name)
+        _set_status(
+            recipe_id, image_name, Recipe.ImageStatus.READY,
+            image_renditions=renditions,
+        )
+    except Exception:
+        logger.exception('Failed to process recipe image %s', image_name)
+        _set_status(recipe_id, image_name, Recipe.ImageStatus.FAILED)
+    finally:
+        invalidate_user(user_id)
+
+
+def rendition_format():
+    """Return the format to encode renditions in.
+
+    Falls back to JPEG when RECIPE_IMAGE_FORMAT is WEBP but Pillow was
+    built without libwebp, which would fail every rendition.
+    """
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    if image_format == 'WEBP' and not features.check('webp'):
+        logger.warning('Pillow cannot encode WebP, using JPEG renditions')
+        return 'JPEG'
+    return image_format
+
+
+def rendition_name(image_name, rendition, image_format):
+    """Return the storage name of a rendition of image_name."""
+    stem = os.path.splitext(image_name)[0]
+    ext = 'webp' if image_format == 'WEBP' else 'jpg'
+    return f'{stem}_{rendition}.{ext}'
+
+
+def render_renditions(image_name):
+    """Decode image_name once and store each configured rendition.
+
+    The EXIF orientation is applied to the pixels and no metadata is
+    written to the renditions. Images are content addressed, so existing
+    renditions of the same name are reused. Returns the storage name of
+    each one.
+    """
+    image_format = rendition_format()
+    sizes = sorted(
+        settings.RECIPE_IMAGE_RENDITIONS.items(),
+        key=lambda item: item[1], reverse=True
+    )
+    renditions = {
+        rendition: rendition_name(image_name, rendition, image_format)
+        for rendition, _ in sizes
+    }
+    if all(default_storage.exists(name) for name in renditions.values()):
+        return renditions
+
+    with default_storage.open(image_name) as image_file:
+        image = Image.open(image_file)
+        # Let JPEG decode at a reduced scale when it can.
+        image.draft('RGB', (sizes[0][1], sizes[0][1]))
+        image.load()
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    for rendition, size in sizes:
+        # Shrink the previous, larger rendition rather than the original.
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, quality=85)
+        name = renditions[rendition]
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        renditions[rendition] = default_storage.save(
+            name, ContentFile(buffer.getvalue())
+        )
+
+    return renditions
+
+
+def delete_image_files(image_name):
+    """Delete a stored image and all its renditions."""
+    Recipe._meta.get_field('image').storage.delete(image_name)
+    for rendition in settings.RECIPE_IMAGE_RENDITIONS:
+        for image_format in ('WEBP', 'JPEG'):
+            default_storage.delete(
+                rendition_name(image_name, rendition, image_format)
+            )
+
+
+def _image_lock_id(image_name):
+    """Return the advisory lock id of a stored image name."""
+    digest = hashlib.sha256(image_name.encode()).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def hold_image(image_name):
+    """Keep a stored image from being released until unhold_image().
+
+    Uploads hold the image their content is stored as from before it is
+    stored, possibly reusing a copy, until the recipe referencing it is
+    saved or the upload discarded. Any number of uploads can hold an
+    image at once, with a shared session advisory lock.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_lock_shared(%s)', [_image_lock_id(image_name)]
+        )
+
+
+def unhold_image(image_name):
+    """Let a stored image held by hold_image() be released again."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_unlock_shared(%s)',
+            [_image_lock_id(image_name)],
+        )
+
+
+def release_image(image_name):
+    """Delete an image once no recipe references it any more.
+
+    A stored image is shared by every recipe uploaded with the same
+    content, the number of recipes naming it is its reference count. The
+    check runs after the current transaction commits, under an exclusive
+    lock on the image. It waits for the uploads holding the image, which
+    may have reused it for a recipe not saved yet.
+    """
+    if not image_name:
+        return
+
+    def release():
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(%s)',
+                    [_image_lock_id(image_name)],
+                )
+            if not Recipe.objects.filter(image=image_name).exists():
+                delete_image_files(image_name)
+
+    transaction.on_commit(release)
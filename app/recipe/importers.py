@@ -0,0 +1,199 @@
+"""
+Bulk import of recipes from NDJSON and CSV streams
+"""
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from rest_framework import serializers
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import invalidate_user
+from recipe.counts import adjust_recipe_counts
+from recipe.search import update_search_vectors
+from recipe.serializers import (
+    RecipeImportSerializer,
+    recipe_through,
+    resolve_names,
+)
+
+
+# Separator of the names in the tags and ingredients columns of a CSV.
+CSV_LIST_SEPARATOR = ';'
+ATTR_FIELDS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def _named(items):
+    """Accept attributes given as plain names or as {'name': ...}."""
+    if not isinstance(items, list):
+        return items
+    return [{'name': item} if isinstance(item, str) else item
+            for item in items]
+
+
+def parse_ndjson(lines):
+    """Yield (line number, record, errors) for each line of NDJSON bytes.
+
+    Blank lines are skipped, errors is None unless the line is not JSON.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, {'non_field_errors': [f'Invalid JSON: {exc}']}
+            continue
+        if isinstance(record, dict):
+            for field in ATTR_FIELDS:
+                if field in record:
+                    record[field] = _named(record[field])
+        yield line_no, record, None
+
+
+def parse_csv(lines):
+    """Yield (line number, record, errors) for each row of CSV bytes.
+
+    The first row names the columns, after an optional byte order mark.
+    Tags and ingredients are lists of names separated by
+    CSV_LIST_SEPARATOR. A line that is not UTF-8 is left out of the CSV
+    and reported on its own, or fails the whole import if it is the first.
+    """
+    line_no = 0
+    undecodable = []
+
+    def decoded():
+        nonlocal line_no
+        for line_no, line in enumerate(lines, start=1):
+            try:
+                yield line.decode('utf-8-sig' if line_no == 1 else 'utf-8')
+            except UnicodeDecodeError as exc:
+                if line_no == 1:
+                    raise serializers.ValidationError(
+                        {'non_field_errors': [f'Invalid UTF-8 header: {exc}']}
+                    )
+                undecodable.append((line_no, exc))
+
+    def decode_errors():
+        for bad_line_no, exc in undecodable:
+            yield bad_line_no, None, {
+                'non_field_errors': [f'Invalid UTF-8: {exc}'],
+            }
+        undecodable.clear()
+
+    reader = csv.DictReader(decoded())
+    for row in reader:
+        yield from decode_errors()
+        record = {
+            key: value for key, value in row.items()
+            if key is not None and value is not None
+        }
+        for field in ATTR_FIELDS:
+            if field in record:
+                record[field] = [
+                    {'name': name.strip()}
+                    for name in record[field].split(CSV_LIST_SEPARATOR)
+                    if name.strip()
+                ]
+        yield line_no, record, None
+    yield from decode_errors()
+
+
+PARSERS = {
+    'ndjson': parse_ndjson,
+    'csv': parse_csv,
+}
+CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+def _validate(serializer, records):
+    """Split parsed records into valid data and error results."""
+    valid, failed = [], []
+    for line_no, record, errors in records:
+        if errors is None:
+            try:
+                valid.append((line_no, serializer.run_validation(record)))
+                continue
+            except serializers.ValidationError as exc:
+                errors = serializers.as_serializer_error(exc)
+        failed.append({'line': line_no, 'errors': errors})
+    return valid, failed
+
+
+def _resolve_attrs(user, model, field, valid):
+    """Return the user's objects for the names used by valid records,
+    keyed by name, with one lookup for the whole chunk."""
+    names = [attr['name'] for _, data in valid for attr in data.get(field, [])]
+    return resolve_names(model, user, names)
+
+
+def _write(user, valid):
+    """Insert the valid records of a chunk and return their results."""
+    attrs = {
+        field: _resolve_attrs(user, model, field, valid)
+        for field, model in ATTR_FIELDS.items()
+    }
+    recipes = Recipe.objects.bulk_create([
+        Recipe(user=user, **{
+            key: value for key, value in data.items()
+            if key not in ATTR_FIELDS
+        })
+        for _, data in valid
+    ])
+
+    for field, model in ATTR_FIELDS.items():
+        through, source, target = recipe_through(field)
+        links = []
+        counts = Counter()
+        for recipe, (_, data) in zip(recipes, valid):
+            pks = {
+                attrs[field][attr['name']].pk
+                for attr in data.get(field, [])
+            }
+            links.extend(through(**{source: recipe.pk, target: pk})
+                         for pk in pks)
+            counts.update(pks)
+        through.objects.bulk_create(links)
+        adjust_recipe_counts(model, counts)
+    update_search_vectors([recipe.pk for recipe in recipes])
+
+    return [
+        {'line': line_no, 'id': recipe.pk}
+        for recipe, (line_no, _) in zip(recipes, valid)
+    ]
+
+
+def import_recipes(user, records, chunk_size=None):
+    """Create recipes for user from parsed records, yielding one result
+    per record in input order.
+
+    Records are validated and written a chunk at a time. Each chunk
+    resolves its tags and ingredients with one lookup per model and
+    inserts its recipes and their links with one bulk INSERT per table,
+    in its own transaction. A result holds the record's line and either
+    the new recipe id or its validation errors.
+    """
+    chunk_size = chunk_size or settings.RECIPE_IMPORT_CHUNK_SIZE
+    serializer = RecipeImportSerializer()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+
+        valid, failed = _validate(serializer, chunk)
+        created = []
+        if valid:
+            with transaction.atomic():
+                created = _write(user, valid)
+                invalidate_user(user.pk)
+
+        yield from sorted(created + failed, key=lambda result: result['line'])
@@ -0,0 +1,89 @@
+"""
+Full text search of recipes and name suggestions
+"""
+import functools
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchVector, TrigramSimilarity,
+)
+from django.db import connections
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Lower
+
+from core.models import Recipe, Tag, Ingredient
+
+
+SEARCH_CONFIG = 'english'
+
+
+def _linked_names(model):
+    """Return the space separated names of model linked to the recipe."""
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(names=StringAgg('name', ' '))
+        .values('names')
+    ), Value(''))
+
+
+def search_vector():
+    """Return the expression computing a recipe's search vector.
+
+    Title words rank highest, then tag and ingredient names, then the
+    description.
+    """
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(_linked_names(Tag), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            _linked_names(Ingredient), weight='B', config=SEARCH_CONFIG
+        )
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipe_ids):
+    """Recompute the stored search vector of recipes with one UPDATE."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        search_vector=search_vector()
+    )
+
+
+def search_query(text):
+    """Return the query matching text as typed in a web search box."""
+    return SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+
+
+# Shorter text has too few trigrams to match fuzzily.
+FUZZY_MIN_LENGTH = 3
+
+
+@functools.lru_cache(maxsize=None)
+def has_trigram_index(using='default'):
+    """Check whether the pg_trgm extension is installed in the database."""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def suggest_by_name(queryset, text, limit):
+    """Return up to limit objects of queryset whose name matches text.
+
+    Names starting with text, ignoring case, come first in name order,
+    read from an index on (user_id, lower(name)), which is unique. When
+    that leaves room, names similar to text follow by trigram similarity,
+    matched through the trigram index on lower(name).
+    """
+    text = text.lower()
+    queryset = queryset.annotate(name_lower=Lower('name')).order_by()
+    matches = list(
+        queryset.filter(name_lower__startswith=text)
+        .order_by('name_lower')[:limit]
+    )
+    if (len(matches) < limit and len(text) >= FUZZY_MIN_LENGTH
+            and has_trigram_index(queryset.db)):
+        matches += queryset.filter(name_lower__trigram_similar=text) \
+            .exclude(pk__in=[obj.pk for obj in matches]) \
+            .annotate(similarity=TrigramSimilarity('name_lower', text)) \
+            .order_by('-similarity', 'name_lower', 'id')[:limit - len(matches)]
+    return matches
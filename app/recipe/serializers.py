@@ -1,30 +1,199 @@
 """
 Serializers for recipe APIs
 """
+import logging
+
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.db.models import Prefetch
+from django.db.models.functions import Lower
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
 
 from core.models import Recipe, Tag, Ingredient
+from recipe.cache import invalidate_user
+from recipe.counts import adjust_recipe_counts
+from recipe.images import release_image
+from recipe.search import update_search_vectors
+
+
+logger = logging.getLogger(__name__)
+
+
+def fold_names(model, names):
+    """Return names lowercased the way the database lowercases them.
+
+    Python's str.lower() folds some names differently from Postgres
+    lower(), such as a final sigma, so names are only ever compared with
+    the database's lowercase of the stored ones once folded here.
+    """
+    connection = connections[router.db_for_write(model)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT lower(name) FROM unnest(%s::text[]) '
+            'WITH ORDINALITY AS given(name, position) ORDER BY position',
+            [list(names)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def resolve_names(model, user, names):
+    """Return the user's objects keyed by each of the given names,
+    creating any missing ones with one SELECT and one bulk INSERT.
+
+    Names are matched ignoring case, the first spelling given wins for new
+    objects. Rows inserted concurrently by another request are skipped by
+    the unique (user_id, lower(name)) index and picked up by a second
+    SELECT, so each name always resolves to a single object.
+    """
+    names = list(names)
+    if not names:
+        return {}
+    folded = fold_names(model, names)
+    wanted = {}
+    for name, key in zip(names, folded):
+        wanted.setdefault(key, name)
+
+    def select(keys):
+        """Map lowercased names in keys to the user's objects."""
+        return {
+            obj.name_lower: obj
+            for obj in model.objects.annotate(name_lower=Lower('name'))
+            .filter(user=user, name_lower__in=keys)
+        }
+
+    objs = select(list(wanted))
+    missing = [key for key in wanted if key not in objs]
+    if missing:
+        model.objects.bulk_create(
+            [model(user=user, name=wanted[key]) for key in missing],
+            ignore_conflicts=True,
+        )
+        objs.update(select(missing))
+
+    return {name: objs[key] for name, key in zip(names, folded)}
+
+
+def get_or_create_by_name(model, user, names):
+    """Return the user's objects with the given names, once each in the
+    order first named, creating any missing ones."""
+    resolved = resolve_names(model, user, names)
+    return list({obj.pk: obj for obj in resolved.values()}.values())
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+def recipe_through(field):
+    """Return the through model and its recipe and target columns."""
+    m2m = Recipe._meta.get_field(field)
+    return (
+        m2m.remote_field.through,
+        m2m.m2m_column_name(),
+        m2m.m2m_reverse_name(),
+    )
+
+
+def link_to_recipe(recipe, field, objs):
+    """Link objs to a new recipe through the M2M field with one bulk
+    INSERT, counting the recipe on each of them."""
+    through, source, target = recipe_through(field)
+    through.objects.bulk_create(
+        [through(**{source: recipe.pk, target: obj.pk}) for obj in objs],
+        ignore_conflicts=True,
+    )
+    adjust_recipe_counts(
+        Recipe._meta.get_field(field).related_model,
+        {obj.pk: 1 for obj in objs},
+    )
+
+
+def set_recipe_links(recipe, field, objs):
+    """Make objs the only links of recipe through the M2M field.
+
+    Only the through rows that changed are deleted or inserted, and the
+    recipe counts of the objects linked or unlinked are adjusted. Returns
+    the number of rows added and removed.
+    """
+    through, source, target = recipe_through(field)
+    current = set(
+        through.objects.filter(**{source: recipe.pk}).values_list(
+            target, flat=True)
+    )
+    wanted = {obj.pk for obj in objs}
+
+    removed = current - wanted
+    if removed:
+        through.objects.filter(
+            **{source: recipe.pk, f'{target}__in': removed}
+        ).delete()
+
+    added = wanted - current
+    if added:
+        through.objects.bulk_create(
+            [through(**{source: recipe.pk, target: pk}) for pk in added]
+        )
+
+    deltas = {pk: 1 for pk in added}
+    deltas.update((pk, -1) for pk in removed)
+    adjust_recipe_counts(Recipe._meta.get_field(field).related_model, deltas)
+
+    return len(added), len(removed)
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for objects a user attaches to recipes"""
+
+    def validate_name(self, value):
+        """Check no other object of the user has this name"""
+        if self.root is not self:
+            # Nested in a recipe, where existing names are reused.
+            return value
+        queryset = self.Meta.model.objects.annotate(
+            name_lower=Lower('name')
+        ).filter(
+            user=self.context['request'].user,
+            name_lower=value.lower(),
+        )
+        if self.instance is not None:
+            queryset = queryset.exclude(pk=self.instance.pk)
+        if queryset.exists():
+            raise serializers.ValidationError(
+                _('You already have one with this name.'),
+                code='unique'
+            )
+        return value
+
+
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for Ingredient Model Class"""
 
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for Tags"""
 
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
 
+class SparseFieldsMixin:
+    """Serializer mixin dropping the fields not named in
+    context['fields'], when it is set."""
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')  # type: ignore
+        if fields is not None:
+            for name in set(self.fields) - set(fields):  # type: ignore
+                self.fields.pop(name)  # type: ignore
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -37,34 +206,75 @@ class RecipeSerializer(serializers.ModelSerializer):
             ]
         read_only_fields = ['id']
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, columns=()):
+        """Load only what serializing fields of a recipe queryset needs.
+
+        Only the columns of the fields are selected, plus any extra
+        columns, such as the ones the results are ordered by, and the
+        nested tags and ingredients are prefetched only when requested.
+        All the serializer's fields are loaded when fields is None.
+        """
+        declared = cls().fields
+        fields = list(declared) if fields is None else fields
+        model_fields = {
+            field.name for field in Recipe._meta.concrete_fields
+        }
+        queryset = queryset.only(
+            *columns,
+            *[declared[name].source for name in fields
+              if declared[name].source in model_fields],
+        )
+
+        nested = {
+            'tags': Tag.objects.only('id', 'name', 'recipe_count'),
+            'ingredients': Ingredient.objects.only(
+                'id', 'name', 'recipe_count'
+            ),
+        }
+        return queryset.prefetch_related(*[
+            Prefetch(name, queryset=nested[name])
+            for name in nested if name in fields
+        ])
+
+    def _get_or_create_attrs(self, model, items):
+        """Get or create the user's objects named in items"""
+        auth_user = self.context['request'].user
+        return get_or_create_by_name(
+            model, auth_user, [item['name'] for item in items]
+        )
+
     def _get_or_create_tags(self, tags, recipe):
         """Handle geting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag
-            )
-            recipe.tags.add(tag_obj)
+        link_to_recipe(recipe, 'tags', self._get_or_create_attrs(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as need"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)
+        link_to_recipe(
+            recipe, 'ingredients',
+            self._get_or_create_attrs(Ingredient, ingredients)
+        )
+
+    def _set_attrs(self, model, field, items, recipe):
+        """Replace the recipe's links, writing only the changed rows"""
+        added, removed = set_recipe_links(
+            recipe, field, self._get_or_create_attrs(model, items)
+        )
+        self.rows_touched[field] = {'added': added, 'removed': removed}
 
     def create(self, validated_data):
         """create a recpie"""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
-        recipe = Recipe.objects.create(**validated_data)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
 
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+            self._get_or_create_tags(tags, recipe)
+            self._get_or_create_ingredients(ingredients, recipe)
+            if tags or ingredients:
+                # Saving indexed the recipe before it had any links.
+                update_search_vectors([recipe.pk])
+            invalidate_user(recipe.user_id)
 
         return recipe
 
@@ -72,33 +282,77 @@ class RecipeSerializer(serializers.ModelSerializer):
         """Update recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+        self.rows_touched = {}
+        with transaction.atomic():
+            if tags is not None:
+                self._set_attrs(Tag, 'tags', tags, instance)
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            if ingredients is not None:
+                self._set_attrs(
+                    Ingredient, 'ingredients', ingredients, instance
+                )
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
 
-        instance.save()
+            instance.save()
+            invalidate_user(instance.user_id)
+
+        logger.info(
+            'Updated recipe %s, link rows touched: %s',
+            instance.pk, self.rows_touched
+        )
         return instance
 
 
+class RecipeImportSerializer(RecipeSerializer):
+    """Serializer validating imported recipe records"""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description']
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Represent stored image renditions by their URLs"""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for rendition, name in value.items():
+            url = default_storage.url(name)
+            urls[rendition] = request.build_absolute_uri(url) \
+                if request is not None else url
+        return urls
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view"""
+    image_renditions = ImageRenditionsField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_status', 'image_renditions',
+        ]
+        read_only_fields = ['id', 'image_status']
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading image to recipe"""
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'image_status', 'image_renditions']
+        read_only_fields = ['id', 'image_status']
         extra_kwargs = {'image': {'required': 'True'}}
+
+    def update(self, instance, validated_data):
+        """Point the recipe at an image the upload handler already stored"""
+        old_image = instance.image.name
+        storage_name = getattr(validated_data['image'], 'storage_name', None)
+        if storage_name:
+            validated_data['image'] = storage_name
+        instance = super().update(instance, validated_data)
+        if old_image != instance.image.name:
+            release_image(old_image)
+        return instance
@@ -0,0 +1,115 @@
+"""
+Signal handlers for the recipe app
+"""
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.counts import adjust_recipe_counts, linked_counts
+from recipe.images import release_image
+from recipe.search import update_search_vectors
+from recipe.serializers import recipe_through
+
+
+RECIPE_FIELDS = {Tag: 'tags', Ingredient: 'ingredients'}
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_recipe_image(sender, instance, **kwargs):
+    """Delete a deleted recipe's image unless other recipes share it"""
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(sender, instance, **kwargs):
+    """Recompute the search vector of a saved recipe"""
+    update_search_vectors([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def index_relinked_recipes(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Recompute the search vector of recipes whose links changed"""
+    if not reverse:
+        if action.startswith('post_'):
+            update_search_vectors([instance.pk])
+    elif action == 'pre_clear':
+        # The links are gone once post_clear is sent.
+        instance._search_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        update_search_vectors(instance._search_recipe_ids)
+    elif action in ('post_add', 'post_remove'):
+        update_search_vectors(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def index_renamed_attr(sender, instance, created, **kwargs):
+    """Recompute the search vector of recipes linked to a renamed tag or
+    ingredient"""
+    if not created:
+        update_search_vectors(
+            Recipe.objects.filter(**{RECIPE_FIELDS[sender]: instance})
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_linked_recipes(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient about to be deleted"""
+    instance._search_recipe_ids = list(
+        instance.recipe_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def index_unlinked_recipes(sender, instance, **kwargs):
+    """Recompute the search vector of the recipes of a deleted tag or
+    ingredient"""
+    update_search_vectors(instance._search_recipe_ids)
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_deleted_recipe(sender, instance, **kwargs):
+    """Take a recipe about to be deleted off the counts of its tags and
+    ingredients"""
+    for model, field in RECIPE_FIELDS.items():
+        through, source, target = recipe_through(field)
+        links = linked_counts(through, target, {source: instance.pk})
+        adjust_recipe_counts(
+            model, {pk: -count for pk, count in links.items()}
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_relinked_recipes(sender, instance, action, reverse, model,
+                           pk_set, **kwargs):
+    """Keep recipe counts in step with links changed through the ORM.
+
+    Links added are the ones missing before, as Django filters pk_set
+    before sending pre_add. Links removed are counted before they go, as
+    pk_set may name objects that were never linked.
+    """
+    attr_model = type(instance) if reverse else model
+    through, source, target = recipe_through(RECIPE_FIELDS[attr_model])
+    if action == 'post_add':
+        adjust_recipe_counts(
+            attr_model,
+            {instance.pk: len(pk_set)} if reverse else
+            {pk: 1 for pk in pk_set},
+        )
+    elif action in ('pre_remove', 'pre_clear'):
+        filters = {target if reverse else source: instance.pk}
+        if action == 'pre_remove':
+            filters[f'{source if reverse else target}__in'] = pk_set
+        links = linked_counts(through, target, filters)
+        instance._count_deltas = {pk: -count for pk, count in links.items()}
+    elif action in ('post_remove', 'post_clear'):
+        adjust_recipe_counts(attr_model, instance._count_deltas)
@@ -3,7 +3,7 @@ Test for Ingrediets Apis
 """
 from decimal import Decimal
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework.test import APIClient
@@ -11,10 +11,12 @@ from rest_framework import status
 
 from core.models import Ingredient, Recipe
 
+from recipe.search import has_trigram_index
 from recipe.serializers import IngredientSerializer
 
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+SUGGEST_URL = reverse('recipe:ingredient-suggest')
 
 
 def detail_url(ingredient_id):
@@ -59,7 +61,7 @@ class PrivateIngredientsApiTest(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)  # type: ignore
+        self.assertEqual(res.data['results'], serializer.data)  # type: ignore
 
     def test_ingredients_limited_to_user(self):
         """Test list of ingredient is limited to authenticated user"""
@@ -71,9 +73,9 @@ class PrivateIngredientsApiTest(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)  # type: ignore
-        self.assertEqual(res.data[0]['name'], ingredient.name)  # type: ignore
-        self.assertEqual(res.data[0]['id'], ingredient.id)  # type: ignore
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)  # type: ignore # noqa
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)  # type: ignore # noqa
 
     def test_ingredient_update(self):
         """Test updating ingredient"""
@@ -112,10 +114,11 @@ class PrivateIngredientsApiTest(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
+        in1.refresh_from_db()
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
-        self.assertIn(s1.data, res.data)  # type: ignore
-        self.assertNotIn(s2.data, res.data)  # type: ignore
+        self.assertIn(s1.data, res.data['results'])  # type: ignore
+        self.assertNotIn(s2.data, res.data['results'])  # type: ignore
 
     def test_filtered_ingredients_unique(self):
         """Test filter ingredients returned unique list"""
@@ -138,4 +141,42 @@ class PrivateIngredientsApiTest(TestCase):
         recipe2.ingredients.add(ing)
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
-        self.assertEqual(len(res.data), 1)  # type: ignore
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+
+    def suggest(self, text):
+        """Return the names suggested for text"""
+        res = self.client.get(SUGGEST_URL, {'q': text})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [ingredient['name'] for ingredient in res.data]
+
+    def test_suggest_by_prefix(self):
+        """Test names starting with the text are suggested, ignoring case"""
+        for name in ['Salt', 'salmon', 'Sea salt', 'Basil']:
+            Ingredient.objects.create(user=self.user, name=name)
+        other = create_user(email='other@example.com')
+        Ingredient.objects.create(user=other, name='Saffron')
+
+        self.assertEqual(self.suggest('SA'), ['salmon', 'Salt'])
+
+    @override_settings(RECIPE_SUGGEST_LIMIT=2)
+    def test_suggest_limited(self):
+        """Test at most the configured number of names are suggested"""
+        for n in range(5):
+            Ingredient.objects.create(user=self.user, name=f'Pepper {n}')
+
+        self.assertEqual(self.suggest('pep'), ['Pepper 0', 'Pepper 1'])
+
+    def test_suggest_similar_names(self):
+        """Test misspelt names are matched by trigram similarity"""
+        if not has_trigram_index():
+            self.skipTest('pg_trgm is not installed')
+        Ingredient.objects.create(user=self.user, name='Cinnamon')
+        Ingredient.objects.create(user=self.user, name='Cumin')
+
+        self.assertEqual(self.suggest('cinamon'), ['Cinnamon'])
+
+    def test_suggest_requires_text(self):
+        """Test the text to match is required"""
+        res = self.client.get(SUGGEST_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,180 @@
+"""
+Test the recipe API queries use their intended indexes
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.search import update_search_vectors
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+
+
+class QueryPlanTests(TestCase):
+    """Test the query plans of the main API list endpoints.
+
+    The test tables are tiny, so sequential and bitmap scans are disabled
+    to make the planner show which index it would walk for the query.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'pass123test'
+        )
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Recipe', time_minutes=5, price='1.00'
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Tag'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Ingredient')
+        )
+
+    def explain_api_query(self, url, table, params=None, match='ORDER BY',
+                          disable=('seqscan', 'bitmapscan')):
+        """Call the API and return the plan of its query on table"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        sql = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM "{table}"' in query['sql'] and match in query['sql']
+        )
+
+        with connection.cursor() as cursor:
+            for scan in disable:
+                cursor.execute(f'SET LOCAL enable_{scan} = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            for scan in disable:
+                cursor.execute(f'RESET enable_{scan}')
+
+        return plan
+
+    def assertUsesIndex(self, plan, index_name):
+        """Assert the query plan scans the named index"""
+        self.assertRegex(
+            plan,
+            rf'(Index (Only )?Scan (Backward )?using|Bitmap Index Scan on) '
+            rf'{index_name} '
+        )
+
+    def test_recipe_list_uses_user_id_index(self):
+        """Test listing recipes walks the (user_id, -id) index"""
+        plan = self.explain_api_query(RECIPE_URL, 'core_recipe')
+
+        self.assertUsesIndex(plan, 'core_recipe_user_id_desc_idx')
+        self.assertNotIn('Sort', plan)
+
+    def test_tag_list_uses_user_name_index(self):
+        """Test listing tags walks the (user_id, name, id) index"""
+        plan = self.explain_api_query(TAGS_URL, 'core_tag')
+
+        self.assertUsesIndex(plan, 'core_tag_user_name_idx')
+        self.assertNotIn('Sort', plan)
+
+    def test_ingredient_list_uses_user_name_index(self):
+        """Test listing ingredients walks the (user_id, name, id) index"""
+        plan = self.explain_api_query(INGREDIENT_URL, 'core_ingredient')
+
+        self.assertUsesIndex(plan, 'core_ingredient_user_name_idx')
+        self.assertNotIn('Sort', plan)
+
+    def test_suggest_uses_name_prefix_index(self):
+        """Test name suggestions walk a (user_id, lower(name)) index.
+
+        The text_pattern_ops index serves any collation, with the C
+        collation the unique index can answer the prefix match too.
+        """
+        plan = self.explain_api_query(
+            reverse('recipe:ingredient-suggest'), 'core_ingredient',
+            {'q': 'ing'}, match='LIKE',
+        )
+
+        self.assertUsesIndex(
+            plan, 'core_ingredient_user_(name_prefix_idx|lower_name_uniq)'
+        )
+        self.assertNotIn('Sort', plan)
+
+    def test_etag_marker_uses_user_index(self):
+        """Test the ETag change marker only reads the user's rows.
+
+        Counting the rows visits all of them, so every index led by
+        user_id costs the same and the planner may pick any of them.
+        """
+        plan = self.explain_api_query(
+            RECIPE_URL, 'core_recipe', match='MAX('
+        )
+
+        self.assertUsesIndex(plan, r'core_recipe_user_\w+')
+
+    def test_assigned_only_uses_partial_index(self):
+        """Test assigned_only reads the partial index of assigned tags
+        without joining recipes"""
+        plan = self.explain_api_query(
+            TAGS_URL, 'core_tag', {'assigned_only': 1}
+        )
+
+        self.assertUsesIndex(plan, 'core_tag_assigned_idx')
+        self.assertNotIn('core_recipe_tags', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_popular_ordering_uses_count_index(self):
+        """Test ordering by recipe count reads the (user, recipe_count)
+        index"""
+        plan = self.explain_api_query(
+            INGREDIENT_URL, 'core_ingredient',
+            {'ordering': '-recipe_count'},
+        )
+
+        self.assertUsesIndex(plan, 'core_ingredient_user_count_idx')
+        self.assertNotIn('Sort', plan)
+
+    def test_range_filter_uses_range_index(self):
+        """Test filtering and sorting by cooking time walks the
+        (user_id, time_minutes, id) index without sorting"""
+        plan = self.explain_api_query(
+            RECIPE_URL, 'core_recipe',
+            {'time_minutes__lte': 30, 'ordering': '-time_minutes'},
+        )
+
+        self.assertUsesIndex(plan, 'core_recipe_user_time_idx')
+        self.assertIn('time_minutes <= 30', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_price_ordering_uses_price_index(self):
+        """Test sorting by price walks the (user_id, price, id) index"""
+        plan = self.explain_api_query(
+            RECIPE_URL, 'core_recipe',
+            {'price__gte': '2.50', 'ordering': 'price'},
+        )
+
+        self.assertUsesIndex(plan, 'core_recipe_user_price_idx')
+        self.assertNotIn('Sort', plan)
+
+    def test_search_uses_gin_index(self):
+        """Test a selective search finds recipes through the search vector
+        GIN index rather than by scanning all the user's recipes"""
+        Recipe.objects.bulk_create([
+            Recipe(user=self.user, title=f'Stew {n}', time_minutes=5,
+                   price='1.00')
+            for n in range(5000)
+        ])
+        update_search_vectors(Recipe.objects.filter(user=self.user))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_recipe')
+
+        plan = self.explain_api_query(
+            RECIPE_URL, 'core_recipe', {'q': 'recipe'}, disable=('seqscan',)
+        )
+
+        self.assertUsesIndex(plan, 'core_recipe_search_idx')
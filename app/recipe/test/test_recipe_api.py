@@ -1,22 +1,37 @@
 """Test for recipe APIs"""
 from decimal import Decimal
+from unittest.mock import patch
 import tempfile
 import os
+import threading
+import time
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from recipe.cache import invalidate_user
+from recipe.images import (
+    hold_image,
+    process_recipe_image,
+    release_image,
+    unhold_image,
+)
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPE_URL = reverse('recipe:recipe-list')
+UPLOAD_DIR = os.path.join('uploads', 'recipe')
 
 
 def detail_url(recipe_id):
@@ -80,7 +95,7 @@ class PrivateRecipeApiTest(TestCase):
         recipe = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)  # type:ignore
+        self.assertEqual(res.data['results'], serializer.data)  # type:ignore
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user"""
@@ -92,7 +107,21 @@ class PrivateRecipeApiTest(TestCase):
         recipe = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)  # type:ignore
+        self.assertEqual(res.data['results'], serializer.data)  # type:ignore
+
+    def test_list_paginated_by_cursor(self):
+        """Test recipe list is paginated newest first with cursors"""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        ids = [r['id'] for r in res.data['results']]  # type: ignore
+        while res.data['next']:  # type: ignore
+            res = self.client.get(res.data['next'])  # type: ignore
+            self.assertLessEqual(len(res.data['results']), 2)  # type: ignore
+            ids.extend(r['id'] for r in res.data['results'])  # type: ignore
+
+        expected = sorted((r.id for r in recipes), reverse=True)  # type: ignore # noqa
+        self.assertEqual(ids, expected)
 
     def test_get_recipe_detail(self):
         """Test get recipe detail"""
@@ -257,6 +286,84 @@ class PrivateRecipeApiTest(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_with_final_sigma_tag(self):
+        """Test tag names Python and Postgres lowercase differently are
+        matched as Postgres does"""
+        tag = Tag.objects.create(user=self.user, name='ΚΑΦΕΣ')
+        payload = {
+            'title': 'Frappe',
+            'time_minutes': 5,
+            'price': Decimal('2.00'),
+            'tags': [{'name': 'ΚΑΦΕΣ'}, {'name': 'İçli'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])  # type: ignore
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertIn(tag, recipe.tags.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_attrs_in_bulk(self):
+        """Test creating tags and ingredients costs the same queries
+        however many are given"""
+        def payload(count):
+            return {
+                'title': 'Bulk Recipe',
+                'time_minutes': 10,
+                'price': Decimal('1.00'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [{'name': f'Ing {i}'} for i in range(count)],
+            }
+        Tag.objects.create(user=self.user, name='Tag 0')
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(RECIPE_URL, payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(RECIPE_URL, payload(30), format='json')
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 30)
+        self.assertEqual(
+            Recipe.objects.filter(user=self.user).last().ingredients.count(),  # type: ignore # noqa
+            30
+        )
+
+    def test_create_recipe_duplicate_tag_names(self):
+        """Test repeated tag names in a payload create one tag"""
+        payload = {
+            'title': 'Toast',
+            'time_minutes': 5,
+            'price': Decimal('1.00'),
+            'tags': [{'name': 'Breakfast'}, {'name': 'Breakfast'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])  # type: ignore
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_recipe_reuses_tags_ignoring_case(self):
+        """Test tag names are matched to existing tags ignoring case"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        payload = {
+            'title': 'Pancakes',
+            'time_minutes': 20,
+            'price': Decimal('3.00'),
+            'tags': [{'name': 'breakfast'}, {'name': 'Sweet'},
+                     {'name': 'SWEET'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])  # type: ignore
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Breakfast', 'Sweet']
+        )
+        self.assertIn(tag, recipe.tags.all())
+
     def test_create_tag_on_update(self):
         """Test create tag when updating a recipe."""
         recipe = create_recipe(user=self.user)
@@ -284,6 +391,32 @@ class PrivateRecipeApiTest(TestCase):
         self.assertIn(tag_lunch, recipe.tags.all())
         self.assertNotIn(tag_breakfast, recipe.tags.all())
 
+    def test_update_tags_only_touches_changed_rows(self):
+        """Test updating tags keeps the links that did not change"""
+        recipe = create_recipe(user=self.user)
+        for name in ['Quick', 'Easy', 'Cheap']:
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+        through = Recipe.tags.through
+        kept = set(through.objects.filter(
+            recipe=recipe, tag__name__in=['Quick', 'Easy']
+        ).values_list('id', flat=True))
+
+        payload = {'tags': [{'name': 'Quick'}, {'name': 'Easy'},
+                            {'name': 'Vegan'}]}
+        url = detail_url(recipe.id)  # type: ignore
+        with self.assertLogs('recipe.serializers', 'INFO') as logs:
+            res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("'tags': {'added': 1, 'removed': 1}", logs.output[0])
+        self.assertTrue(kept.issubset(
+            through.objects.filter(recipe=recipe).values_list('id', flat=True)
+        ))
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Easy', 'Quick', 'Vegan']
+        )
+
     def test_clear_recipe_tags(self):
         """Test clearing a recipes tags."""
         tag = Tag.objects.create(user=self.user, name='Dessert')
@@ -404,9 +537,9 @@ class PrivateRecipeApiTest(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)  # type: ignore
-        self.assertIn(s2.data, res.data)  # type: ignore
-        self.assertNotIn(s3.data, res.data)  # type: ignore
+        self.assertIn(s1.data, res.data['results'])  # type: ignore
+        self.assertIn(s2.data, res.data['results'])  # type: ignore
+        self.assertNotIn(s3.data, res.data['results'])  # type: ignore
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -424,9 +557,381 @@ class PrivateRecipeApiTest(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        self.assertIn(s1.data, res.data)  # type: ignore
-        self.assertIn(s2.data, res.data)  # type: ignore
-        self.assertNotIn(s3.data, res.data)  # type: ignore
+        self.assertIn(s1.data, res.data['results'])  # type: ignore
+        self.assertIn(s2.data, res.data['results'])  # type: ignore
+        self.assertNotIn(s3.data, res.data['results'])  # type: ignore
+
+    def test_filter_by_all_tags(self):
+        """Test filtering recipes that have all of the given tags"""
+        r1 = create_recipe(user=self.user, title='Vegan Curry')
+        r2 = create_recipe(user=self.user, title='Vegan Salad')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        params = {
+            'tags': f'{tag1.id},{tag2.id}',  # type: ignore
+            'tags_mode': 'all',
+        }
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'], [RecipeSerializer(r1).data]  # type: ignore
+        )
+
+    def test_filter_any_returns_each_recipe_once(self):
+        """Test recipes matching several tags are listed once"""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Quick')
+        tag2 = Tag.objects.create(user=self.user, name='Easy')
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}  # type: ignore
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+
+    def test_filter_invalid_params(self):
+        """Test invalid filter params return a bad request"""
+        for params in [{'tags': '1,abc'}, {'tags': '1', 'tags_mode': 'x'}]:
+            res = self.client.get(RECIPE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def list_titles(self, **params):
+        """Walk every page of the recipe list and return the titles"""
+        titles, url = [], RECIPE_URL
+        while url:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            titles += [recipe['title'] for recipe in res.data['results']]
+            url, params = res.data['next'], {}
+        return titles
+
+    def test_filter_by_time_and_price_range(self):
+        """Test recipes are filtered by inclusive time and price bounds"""
+        create_recipe(user=self.user, title='Toast', time_minutes=5,
+                      price=Decimal('1.50'))
+        create_recipe(user=self.user, title='Curry', time_minutes=30,
+                      price=Decimal('9.99'))
+        create_recipe(user=self.user, title='Roast', time_minutes=90,
+                      price=Decimal('25.00'))
+
+        self.assertEqual(self.list_titles(time_minutes__lte=30),
+                         ['Curry', 'Toast'])
+        self.assertEqual(self.list_titles(price__lte='10'),
+                         ['Curry', 'Toast'])
+        self.assertEqual(
+            self.list_titles(time_minutes__gte=30, price__lte='9.99'),
+            ['Curry'],
+        )
+
+    def test_order_by_time_and_price(self):
+        """Test recipes are sorted by time or price across pages, ties
+        broken by id"""
+        for title, minutes, price in [('A', 20, '3.00'), ('B', 10, '3.00'),
+                                      ('C', 20, '1.00'), ('D', 5, '8.00')]:
+            create_recipe(user=self.user, title=title, time_minutes=minutes,
+                          price=Decimal(price))
+
+        self.assertEqual(
+            self.list_titles(ordering='time_minutes', page_size=1),
+            ['D', 'B', 'A', 'C'],
+        )
+        self.assertEqual(self.list_titles(ordering='-price', page_size=3),
+                         ['D', 'B', 'A', 'C'])
+
+    def test_range_and_ordering_invalid_params(self):
+        """Test malformed bounds and orderings return validated errors"""
+        res = self.client.get(
+            RECIPE_URL, {'time_minutes__lte': 'soon', 'price__gte': '-1'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('time_minutes__lte', res.data)  # type: ignore
+        self.assertIn('price__gte', res.data)  # type: ignore
+
+        for ordering in ['title', '--price']:
+            res = self.client.get(RECIPE_URL, {'ordering': ordering})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def search(self, text, **params):
+        """Search the recipe list and return the result titles"""
+        res = self.client.get(RECIPE_URL, {'q': text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_search_matches_title_description_and_names(self):
+        """Test search matches words of the title, description, tags and
+        ingredients, best matches first"""
+        by_title = create_recipe(user=self.user, title='Lentil Soup')
+        by_tag = create_recipe(user=self.user, title='Curry')
+        by_tag.tags.add(Tag.objects.create(user=self.user, name='Lentils'))
+        by_ingredient = create_recipe(user=self.user, title='Daal')
+        by_ingredient.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Red lentils')
+        )
+        create_recipe(
+            user=self.user, title='Stew', description='Add lentils last.'
+        )
+        create_recipe(user=self.user, title='Fish and Chips')
+        other = get_user_model().objects.create_user(  # type: ignore
+            'other@example.com', 'password123'
+        )
+        create_recipe(user=other, title='Lentil Salad')
+
+        titles = self.search('lentil')
+
+        self.assertEqual(len(titles), 4)
+        self.assertEqual(titles[0], by_title.title)
+        self.assertEqual(titles[-1], 'Stew')
+        self.assertEqual(
+            set(titles[1:3]), {by_tag.title, by_ingredient.title}
+        )
+
+    def test_search_follows_renames_and_links(self):
+        """Test the search vector is kept up to date"""
+        recipe = create_recipe(user=self.user, title='Curry')
+        tag = Tag.objects.create(user=self.user, name='Spicy')
+        recipe.tags.add(tag)
+        tag.name = 'Mild'
+        tag.save()
+        invalidate_user(self.user.id)
+
+        self.assertEqual(self.search('mild'), ['Curry'])
+        self.assertEqual(self.search('spicy'), [])
+
+        recipe.tags.clear()
+        invalidate_user(self.user.id)
+        self.assertEqual(self.search('mild'), [])
+
+        payload = {'title': 'Green curry', 'ingredients': [{'name': 'Lime'}]}
+        self.client.patch(detail_url(recipe.id), payload, format='json')
+        self.assertEqual(self.search('lime green'), ['Green curry'])
+
+    def test_search_with_filters_and_pagination(self):
+        """Test search combines with the tag filter and pages by rank"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for n in range(5):
+            recipe = create_recipe(
+                user=self.user, title=f'Bean Chili {n}',
+                description='beans ' * n,
+            )
+            if n != 2:
+                recipe.tags.add(tag)
+        create_recipe(user=self.user, title='Rice')
+
+        titles, params = [], {'q': 'beans', 'tags': tag.id, 'page_size': 2}
+        url = RECIPE_URL
+        while url:
+            res = self.client.get(url, params)
+            titles += [recipe['title'] for recipe in res.data['results']]
+            url, params = res.data['next'], None
+
+        self.assertEqual(
+            titles, [f'Bean Chili {n}' for n in (4, 3, 1, 0)]
+        )
+
+    def test_search_ranks_newest_matches_only(self):
+        """Test only the newest matches are ranked, after the other
+        filters"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=self.user, title='Beans').tags.add(tag)
+        for n in range(3):
+            create_recipe(
+                user=self.user, title=f'Chili {n}', description='beans',
+            )
+
+        with override_settings(RECIPE_SEARCH_MAX_RANKED=2):
+            self.assertEqual(self.search('beans'), ['Chili 2', 'Chili 1'])
+            self.assertEqual(self.search('beans', tags=tag.id), ['Beans'])
+
+    def test_search_pages_through_equal_ranks(self):
+        """Test paging through recipes sharing ranks ends, each recipe
+        once"""
+        for n in range(12):
+            create_recipe(
+                user=self.user, title=f'Bean Chili {n}',
+                description='beans ' * (n % 4 + 1),
+            )
+
+        titles, params = [], {'q': 'beans', 'page_size': 2}
+        url = RECIPE_URL
+        for _ in range(12):
+            res = self.client.get(url, params)
+            titles += [recipe['title'] for recipe in res.data['results']]
+            url, params = res.data['next'], None
+            if not url:
+                break
+
+        self.assertIsNone(url)
+        self.assertEqual(
+            sorted(titles), sorted(f'Bean Chili {n}' for n in range(12))
+        )
+
+    def test_list_served_from_cache(self):
+        """Test a repeated recipe list is served from the cache"""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+
+        # Only the ETag change marker is read from the database.
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPE_URL)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, res.data)  # type: ignore
+
+    def test_cache_keyed_by_query_params(self):
+        """Test cached lists are not shared between filters"""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+
+        self.client.get(RECIPE_URL)
+        res = self.client.get(RECIPE_URL, {'tags': tag.id})  # type: ignore
+
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+
+    def test_writes_invalidate_cache(self):
+        """Test creating, updating and deleting refresh cached lists"""
+        self.client.get(RECIPE_URL)
+        payload = {
+            'title': 'Cached Recipe',
+            'time_minutes': 10,
+            'price': Decimal('1.00'),
+        }
+        res = self.client.post(RECIPE_URL, payload)
+        recipe_id = res.data['id']  # type: ignore
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+
+        self.client.get(detail_url(recipe_id))
+        self.client.patch(detail_url(recipe_id), {'title': 'New Title'})
+        res = self.client.get(detail_url(recipe_id))
+        self.assertEqual(res.data['title'], 'New Title')  # type: ignore
+
+        self.client.delete(detail_url(recipe_id))
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'], [])  # type: ignore
+
+    def test_conditional_get_not_modified(self):
+        """Test a matching If-None-Match gets 304 without serializing"""
+        recipe = create_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))  # type: ignore
+        etag = res['ETag']
+
+        with patch.object(RecipeDetailSerializer, 'to_representation') as rep:
+            res = self.client.get(
+                detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag  # type: ignore # noqa
+            )
+            rep.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_on_write(self):
+        """Test the ETag changes when the user's recipes change"""
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        recipe.title = 'Changed outside the API'
+        recipe.save()
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(
+            res.data['results'][0]['title'],  # type: ignore
+            'Changed outside the API'
+        )
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def _create_recipes_with_attrs(self, count):
+        """Create recipes which each have a tag and an ingredient"""
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            name = f'{recipe.id}'  # type: ignore
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=name)
+            )
+        invalidate_user(self.user.id)  # type: ignore
+
+    def test_list_query_count_constant(self):
+        """Test listing recipes does not run queries per recipe"""
+        self._create_recipes_with_attrs(2)
+        with CaptureQueriesContext(connection) as small:
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 2)  # type: ignore
+
+        self._create_recipes_with_attrs(8)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data['results']), 10)  # type: ignore
+
+        self.assertEqual(len(small), len(large))
+
+    def test_detail_prefetches_tags_and_ingredients(self):
+        """Test recipe detail loads nested objects with prefetches"""
+        self._create_recipes_with_attrs(1)
+        recipe = Recipe.objects.get(user=self.user)
+
+        # The ETag change marker, the recipe, its tags and ingredients.
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))  # type: ignore
+
+        self.assertEqual(len(res.data['tags']), 1)  # type: ignore
+        self.assertEqual(len(res.data['ingredients']), 1)  # type: ignore
+
+    def test_list_sparse_fields(self):
+        """Test ?fields= trims the list and skips unneeded queries"""
+        self._create_recipes_with_attrs(3)
+
+        # The ETag change marker and the recipes, no prefetches.
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                RECIPE_URL,
+                {'fields': 'id,title,time_minutes', 'ordering': 'price'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 2)
+        for recipe in res.data['results']:  # type: ignore
+            self.assertEqual(set(recipe), {'id', 'title', 'time_minutes'})
+        select = queries[-1]['sql']
+        self.assertIn('"core_recipe"."price"', select)
+        self.assertNotIn('"core_recipe"."link"', select)
+        self.assertNotIn('"core_recipe"."search_vector"', select)
+
+    def test_detail_sparse_fields(self):
+        """Test ?fields= on a recipe detail prefetches only what is
+        requested"""
+        self._create_recipes_with_attrs(1)
+        recipe = Recipe.objects.get(user=self.user)
+
+        # The ETag change marker, the recipe and its tags.
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                detail_url(recipe.id), {'fields': 'title,tags'}  # type: ignore # noqa
+            )
+
+        self.assertEqual(set(res.data), {'title', 'tags'})  # type: ignore
+
+    def test_unknown_sparse_fields(self):
+        """Test requesting an unknown field returns a bad request"""
+        res = self.client.get(RECIPE_URL, {'fields': 'title,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)  # type: ignore
 
 
 class ImageUploadTests(TestCase):
@@ -442,8 +947,21 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for name in self.recipe.image_renditions.values():
+            default_storage.delete(name)
         self.recipe.image.delete()
 
+    def upload_image(self, img):
+        """Upload img to the recipe as a JPEG"""
+        url = image_upload_url(self.recipe.id)  # type: ignore
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img.save(image_file, format='JPEG')
+            image_file.seek(0)
+            return self.client.post(
+                url, {'image': image_file}, format='multipart'
+            )
+
     def test_upload_image(self):
         """Test uploading an image to a recipe."""
         url = image_upload_url(self.recipe.id)  # type: ignore
@@ -466,3 +984,216 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def stored_uploads(self):
+        """Return the names of the stored recipe images"""
+        return set(default_storage.listdir(UPLOAD_DIR)[1]) \
+            if default_storage.exists(UPLOAD_DIR) else set()
+
+    def test_upload_streamed_to_final_name(self):
+        """Test the upload is stored once, named by its real format"""
+        before = self.stored_uploads()
+        url = image_upload_url(self.recipe.id)  # type: ignore
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(
+                url, {'image': image_file}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.jpg'))
+        self.assertEqual(
+            self.stored_uploads() - before,
+            {os.path.basename(self.recipe.image.name)}
+        )
+
+    def test_upload_not_an_image_rejected(self):
+        """Test a payload without image magic bytes is not stored"""
+        before = self.stored_uploads()
+        url = image_upload_url(self.recipe.id)  # type: ignore
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'#!/bin/sh\necho not an image\n')
+            image_file.seek(0)
+            res = self.client.post(
+                url, {'image': image_file}, format='multipart'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)  # type: ignore
+        self.assertEqual(self.stored_uploads(), before)
+
+    def test_upload_corrupt_image_discarded(self):
+        """Test a payload with image magic bytes Pillow cannot read is
+        stored, then deleted once rejected"""
+        before = self.stored_uploads()
+        url = image_upload_url(self.recipe.id)  # type: ignore
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'\xff\xd8\xff' + b'corrupt' * 100)
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    url, {'image': image_file}, format='multipart'
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)  # type: ignore
+        self.assertEqual(self.stored_uploads(), before)
+
+    def test_identical_uploads_share_one_file(self):
+        """Test the same image uploaded to two recipes is stored once"""
+        other = create_recipe(user=self.user)
+        img = Image.new('RGB', (10, 10), color='red')
+        self.upload_image(img)
+        before = self.stored_uploads()
+        self.recipe, first = other, self.recipe
+        self.upload_image(img)
+
+        other.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(other.image.name, first.image.name)
+        self.assertEqual(self.stored_uploads(), before)
+
+        # The shared file stays until its last recipe lets go of it.
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(other.image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload_image(Image.new('RGB', (10, 10), color='blue'))
+        self.assertFalse(default_storage.exists(first.image.name))
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_upload_too_large_rejected(self):
+        """Test an upload over the size limit is refused"""
+        before = self.stored_uploads()
+        url = image_upload_url(self.recipe.id)  # type: ignore
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'\xff\xd8\xff' + b'\0' * 4096)
+            image_file.seek(0)
+            res = self.client.post(
+                url, {'image': image_file}, format='multipart'
+            )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertEqual(self.stored_uploads(), before)
+
+    @patch('recipe.images.get_executor')
+    def test_upload_schedules_processing(self, mock_executor):
+        """Test uploading an image queues its processing after commit"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            res = self.upload_image(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['image_status'], Recipe.ImageStatus.PENDING
+        )  # type: ignore
+        self.assertEqual(res.data['image_renditions'], {})  # type: ignore
+        mock_executor.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        mock_executor.return_value.submit.assert_called_once()
+
+    def test_processing_renders_renditions(self):
+        """Test processing stores resized renditions without EXIF data"""
+        img = Image.new('RGB', (2000, 1000))
+        exif = img.getexif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees
+        exif[0x010f] = 'Camera'
+        url = image_upload_url(self.recipe.id)  # type: ignore
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img.save(image_file, format='JPEG', exif=exif)
+            image_file.seek(0)
+            self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        process_recipe_image(
+            self.recipe.id, self.user.id, self.recipe.image.name
+        )  # type: ignore
+
+        res = self.client.get(detail_url(self.recipe.id))  # type: ignore
+        self.assertEqual(res.data['image_status'], Recipe.ImageStatus.READY)
+        self.recipe.refresh_from_db()
+        renditions = self.recipe.image_renditions
+        self.assertEqual(set(renditions), {'thumb', 'medium', 'large'})
+        self.assertEqual(
+            set(res.data['image_renditions']), set(renditions)
+        )  # type: ignore
+        with default_storage.open(renditions['medium']) as f:
+            rendition = Image.open(f)
+            rendition.load()
+        # The orientation is applied to the pixels, portrait now.
+        self.assertEqual(rendition.size, (300, 600))
+        self.assertEqual(len(rendition.getexif()), 0)
+
+    @patch('recipe.images.features.check', return_value=False)
+    def test_processing_without_webp_uses_jpeg(self, mock_check):
+        """Test renditions fall back to JPEG when WebP is unavailable"""
+        self.upload_image(Image.new('RGB', (10, 10)))
+        self.recipe.refresh_from_db()
+
+        with override_settings(RECIPE_IMAGE_FORMAT='WEBP'), \
+                self.assertLogs('recipe.images', level='WARNING'):
+            process_recipe_image(
+                self.recipe.id, self.user.id, self.recipe.image.name
+            )  # type: ignore
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        for name in self.recipe.image_renditions.values():
+            self.assertTrue(name.endswith('.jpg'))
+            with default_storage.open(name) as f:
+                self.assertEqual(Image.open(f).format, 'JPEG')
+
+    def test_processing_failure_marks_failed(self):
+        """Test an undecodable image is marked failed"""
+        self.upload_image(Image.new('RGB', (10, 10)))
+        self.recipe.refresh_from_db()
+
+        with patch('recipe.images.render_renditions',
+                   side_effect=OSError('broken')), \
+                self.assertLogs('recipe.images', level='ERROR'):
+            process_recipe_image(
+                self.recipe.id, self.user.id, self.recipe.image.name
+            )  # type: ignore
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.image_status, Recipe.ImageStatus.FAILED
+        )
+
+
+class ImageReleaseTests(TransactionTestCase):
+    """Test releasing images shared with uploads in progress"""
+
+    def test_release_waits_for_upload_holding_image(self):
+        """Test an image an upload reused is kept until its recipe is
+        saved"""
+        user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'password123'
+        )
+        storage = Recipe._meta.get_field('image').storage
+        name = storage.save(
+            os.path.join(UPLOAD_DIR, 'sample.jpg'), ContentFile(b'image')
+        )
+        held = threading.Event()
+
+        def upload():
+            hold_image(name)
+            held.set()
+            time.sleep(0.2)
+            create_recipe(user=user, image=name)
+            unhold_image(name)
+            connection.close()
+
+        thread = threading.Thread(target=upload)
+        thread.start()
+        held.wait()
+        release_image(name)
+        thread.join()
+
+        self.assertTrue(storage.exists(name))
+        storage.delete(name)
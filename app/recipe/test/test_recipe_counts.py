@@ -0,0 +1,137 @@
+"""
+Tests for the recipe counts of tags and ingredients
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+IMPORT_URL = reverse('recipe:recipe-bulk-import')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeCountTests(TestCase):
+    """Test recipe counts follow the recipe links"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def counts(self, model):
+        """Return the recipe count of each of the user's objects by name"""
+        return dict(model.objects.filter(user=self.user).values_list(
+            'name', 'recipe_count'))
+
+    def create_recipe(self, title, **params):
+        """Create a recipe through the API and return its ID"""
+        payload = {'title': title, 'time_minutes': 5, 'price': '1.00'}
+        payload.update(params)
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']  # type: ignore
+
+    def test_counts_follow_api_writes(self):
+        """Test creating, updating and deleting recipes adjusts counts"""
+        first = self.create_recipe(
+            'Curry', tags=[{'name': 'Vegan'}, {'name': 'vegan'}],
+            ingredients=[{'name': 'Rice'}],
+        )
+        self.create_recipe(
+            'Salad', tags=[{'name': 'Vegan'}, {'name': 'Quick'}]
+        )
+        self.assertEqual(self.counts(Tag), {'Vegan': 2, 'Quick': 1})
+
+        self.client.patch(
+            detail_url(first), {'tags': [{'name': 'Quick'}]}, format='json'
+        )
+        self.assertEqual(self.counts(Tag), {'Vegan': 1, 'Quick': 2})
+
+        self.client.delete(detail_url(first))
+        self.assertEqual(self.counts(Tag), {'Vegan': 1, 'Quick': 1})
+        self.assertEqual(self.counts(Ingredient), {'Rice': 0})
+
+    def test_counts_follow_orm_links(self):
+        """Test links changed through the ORM, from either side, adjust
+        counts"""
+        recipes = [
+            Recipe.objects.create(user=self.user, title=f'Recipe {n}',
+                                  time_minutes=5, price='1.00')
+            for n in range(3)
+        ]
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        other = Tag.objects.create(user=self.user, name='Quick')
+
+        recipes[0].tags.add(tag, other)
+        recipes[0].tags.add(tag)
+        tag.recipe_set.add(recipes[1], recipes[2])
+        self.assertEqual(self.counts(Tag), {'Vegan': 3, 'Quick': 1})
+
+        recipes[1].tags.remove(tag, other)
+        tag.recipe_set.remove(recipes[2])
+        self.assertEqual(self.counts(Tag), {'Vegan': 1, 'Quick': 1})
+
+        tag.name = 'Plant based'
+        tag.save()
+        recipes[0].tags.clear()
+        self.assertEqual(self.counts(Tag), {'Plant based': 0, 'Quick': 0})
+
+        recipes[0].tags.set([tag])
+        recipes[0].delete()
+        self.assertEqual(self.counts(Tag), {'Plant based': 0, 'Quick': 0})
+
+    def test_import_counts_links(self):
+        """Test imported recipes are counted on their tags"""
+        body = '\n'.join([
+            '{"title": "A", "time_minutes": 5, "price": "1.00", '
+            '"tags": [{"name": "Vegan"}]}',
+            '{"title": "B", "time_minutes": 5, "price": "1.00", '
+            '"tags": [{"name": "vegan"}, {"name": "Quick"}]}',
+        ])
+
+        self.client.post(
+            IMPORT_URL, data=body, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(self.counts(Tag), {'Vegan': 2, 'Quick': 1})
+
+    def test_order_by_recipe_count(self):
+        """Test listing tags most used first, across pages"""
+        recipes = [
+            Recipe.objects.create(user=self.user, title=f'Recipe {n}',
+                                  time_minutes=5, price='1.00')
+            for n in range(3)
+        ]
+        for n, name in enumerate(['Rare', 'Common', 'Usual']):
+            tag = Tag.objects.create(user=self.user, name=name)
+            tag.recipe_set.add(*recipes[:[1, 3, 2][n]])
+        Tag.objects.create(user=self.user, name='Unused')
+
+        names = []
+        url, params = TAGS_URL, {'ordering': '-recipe_count', 'page_size': 2}
+        while url:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            names += [tag['name'] for tag in res.data['results']]  # type: ignore # noqa
+            url, params = res.data['next'], None  # type: ignore
+
+        self.assertEqual(names, ['Common', 'Usual', 'Rare', 'Unused'])
+
+    def test_invalid_ordering(self):
+        """Test ordering by an unknown field is refused"""
+        res = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,95 @@
+"""
+Tests for the streaming recipe export
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, n):
+    """Create a recipe with two tags and an ingredient"""
+    recipe = Recipe.objects.create(
+        user=user, title=f'Recipe {n}', time_minutes=n, price='4.50'
+    )
+    recipe.tags.add(
+        Tag.objects.get_or_create(user=user, name='Dinner')[0],
+        Tag.objects.get_or_create(user=user, name=f'Tag {n}')[0],
+    )
+    recipe.ingredients.add(
+        Ingredient.objects.get_or_create(user=user, name='Salt')[0]
+    )
+    return recipe
+
+
+class RecipeExportTests(TestCase):
+    """Test exporting a user's recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [create_recipe(self.user, n) for n in range(5)]
+
+    def content(self, res):
+        """Return the streamed body of res"""
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test every recipe is streamed as a JSON line"""
+        other = get_user_model().objects.create_user(  # type: ignore
+            'other@example.com', 'testpass123'
+        )
+        create_recipe(other, 9)
+
+        res = self.client.get(EXPORT_URL, {'format': 'ndjson'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('application/x-ndjson'))
+        lines = [json.loads(line) for line in self.content(res).splitlines()]
+        self.assertEqual([line['id'] for line in lines],
+                         [recipe.id for recipe in self.recipes])
+        self.assertEqual(lines[2]['tags'], ['Dinner', 'Tag 2'])
+        self.assertEqual(lines[2]['ingredients'], ['Salt'])
+        self.assertEqual(lines[2]['price'], '4.50')
+
+    def test_export_csv(self):
+        """Test the CSV export uses the import columns"""
+        res = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(io.StringIO(self.content(res))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['title'], 'Recipe 0')
+        self.assertEqual(rows[0]['tags'], 'Dinner;Tag 0')
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_queries_per_chunk(self):
+        """Test names are fetched once per chunk, not once per recipe"""
+        res = self.client.get(EXPORT_URL)
+
+        # The recipe cursor, then tags and ingredients for 3 chunks, in a
+        # transaction, here a savepoint and its release.
+        with self.assertNumQueries(1 + 2 * 3 + 2):
+            content = self.content(res)
+        self.assertEqual(len(content.splitlines()), 5)
+
+    def test_export_requires_auth(self):
+        """Test unauthenticated exports are refused"""
+        res = APIClient().get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
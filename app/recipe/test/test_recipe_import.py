@@ -0,0 +1,185 @@
+"""
+Tests for the bulk recipe import
+"""
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+
+IMPORT_URL = reverse('recipe:recipe-bulk-import')
+
+
+def ndjson(records):
+    """Return records as an NDJSON body"""
+    return '\n'.join(json.dumps(record) for record in records) + '\n'
+
+
+def sample_record(n, **params):
+    """Return a valid import record"""
+    record = {
+        'title': f'Recipe {n}',
+        'time_minutes': 10,
+        'price': '2.50',
+        'tags': [f'Tag {n % 3}', 'Dinner'],
+        'ingredients': [f'Ingredient {n % 5}'],
+    }
+    record.update(params)
+    return record
+
+
+class RecipeImportTests(TestCase):
+    """Test importing recipes in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            'user@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def post(self, body, content_type='application/x-ndjson'):
+        """Post an import body"""
+        return self.client.post(
+            IMPORT_URL, data=body, content_type=content_type
+        )
+
+    def test_import_ndjson(self):
+        """Test NDJSON records are created with their tags and ingredients"""
+        res = self.post(ndjson([sample_record(n) for n in range(4)]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 4)  # type: ignore
+        self.assertEqual(res.data['failed'], 0)  # type: ignore
+        recipe = Recipe.objects.get(pk=res.data['results'][1]['id'])
+        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(recipe.price, Decimal('2.50'))
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Dinner', 'Tag 1'],
+        )
+        self.assertEqual(Tag.objects.filter(name='Dinner').count(), 1)
+
+    def test_import_reports_errors_per_record(self):
+        """Test invalid records get their own error and do not stop the
+        others"""
+        body = '\n'.join([
+            json.dumps(sample_record(1)),
+            '{not json',
+            json.dumps(sample_record(2, title='')),
+            json.dumps(sample_record(3)),
+        ])
+
+        res = self.post(body)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']  # type: ignore
+        self.assertEqual([result['line'] for result in results], [1, 2, 3, 4])
+        self.assertIn('id', results[0])
+        self.assertIn('non_field_errors', results[1]['errors'])
+        self.assertIn('title', results[2]['errors'])
+        self.assertIn('id', results[3])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_import_names_lowercased_by_database(self):
+        """Test names Python lowercases differently from Postgres, such as
+        a final sigma, resolve to one tag"""
+        body = ndjson([
+            sample_record(1, tags=['ΚΑΦΕΣ']),
+            sample_record(2, tags=['ΚΑΦΕΣ', 'İçli']),
+        ])
+
+        res = self.post(body)
+
+        self.assertEqual(res.data['created'], 2)  # type: ignore
+        self.assertEqual(Tag.objects.filter(name='ΚΑΦΕΣ').count(), 1)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_import_csv(self):
+        """Test CSV rows are imported, reusing existing tags ignoring case"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        body = (
+            'title,time_minutes,price,tags,ingredients\n'
+            'Curry,30,5.00,vegan;Spicy,Rice;Lentils\n'
+            '"Soup, cold",10,3.00,,Tomato\n'
+        )
+
+        res = self.post(body, content_type='text/csv; charset=utf-8')
+
+        self.assertEqual(res.data['created'], 2)  # type: ignore
+        curry = Recipe.objects.get(title='Curry')
+        self.assertIn(tag, curry.tags.all())
+        self.assertEqual(curry.ingredients.count(), 2)
+        self.assertEqual(Recipe.objects.get(title='Soup, cold').tags.count(),
+                         0)
+
+    def test_import_csv_with_byte_order_mark(self):
+        """Test a byte order mark before the CSV header is ignored"""
+        body = '\ufefftitle,time_minutes,price\nCurry,30,5.00\n'
+
+        res = self.post(body.encode('utf-8'), content_type='text/csv')
+
+        self.assertEqual(res.data['created'], 1)  # type: ignore
+        self.assertTrue(Recipe.objects.filter(title='Curry').exists())
+
+    def test_import_csv_reports_invalid_utf8_per_row(self):
+        """Test a row that is not UTF-8 gets its own error"""
+        body = (
+            b'title,time_minutes,price\n'
+            b'Curry,30,5.00\n'
+            b'Cr\xe8me,10,3.00\n'
+            b'Soup,10,3.00\n'
+        )
+
+        res = self.post(body, content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results']  # type: ignore
+        self.assertEqual([result['line'] for result in results], [2, 3, 4])
+        self.assertIn('non_field_errors', results[1]['errors'])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_import_csv_invalid_utf8_header(self):
+        """Test a CSV header that is not UTF-8 fails the import"""
+        body = b'titl\xe9,time_minutes,price\nCurry,30,5.00\n'
+
+        res = self.post(body, content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    def test_import_queries_do_not_grow_with_records(self):
+        """Test a chunk is written with a constant number of queries"""
+        def records(prefix, count):
+            return ndjson([
+                sample_record(
+                    n, tags=[f'{prefix} tag {n % 4}'],
+                    ingredients=[f'{prefix} ingredient {n}'],
+                )
+                for n in range(count)
+            ])
+
+        with CaptureQueriesContext(connection) as few:
+            self.post(records('few', 3))
+        with CaptureQueriesContext(connection) as many:
+            self.post(records('many', 57))
+
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(Recipe.objects.count(), 60)
+
+    def test_import_unsupported_type(self):
+        """Test bodies other than NDJSON or CSV are refused"""
+        res = self.post('<recipes/>', content_type='application/xml')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
@@ -58,7 +58,7 @@ class PrivateTagsApiTest(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)  # type: ignore
+        self.assertEqual(res.data['results'], serializer.data)  # type: ignore
 
     def test_tags_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -69,9 +69,22 @@ class PrivateTagsApiTest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)  # type: ignore
-        self.assertEqual(res.data[0]['name'], tag.name)  # type: ignore
-        self.assertEqual(res.data[0]['id'], tag.id)  # type: ignore
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+        self.assertEqual(res.data['results'][0]['name'], tag.name)  # type: ignore # noqa
+        self.assertEqual(res.data['results'][0]['id'], tag.id)  # type: ignore
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paged by descending name then id"""
+        for name in ['Lunch', 'Dinner', 'Snack', 'Brunch']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 1})
+        names = [t['name'] for t in res.data['results']]  # type: ignore
+        while res.data['next']:  # type: ignore
+            res = self.client.get(res.data['next'])  # type: ignore
+            names.extend(t['name'] for t in res.data['results'])  # type: ignore # noqa
+
+        self.assertEqual(names, ['Snack', 'Lunch', 'Dinner', 'Brunch'])
 
     def test_tag_update(self):
         """Test updating tag"""
@@ -85,6 +98,28 @@ class PrivateTagsApiTest(TestCase):
         tag.refresh_from_db()
         self.assertEquals(tag.name, payload['name'])
 
+    def test_tag_update_duplicate_name_error(self):
+        """Test renaming a tag to another tag's name is rejected"""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After Dinner')
+
+        url = detail_url(tag.id)  # type: ignore
+        res = self.client.patch(url, {'name': 'dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After Dinner')
+
+    def test_tag_update_invalidates_cached_list(self):
+        """Test renaming a tag refreshes the cached tag list"""
+        tag = Tag.objects.create(user=self.user, name='After Dinner')
+        self.client.get(TAGS_URL)
+
+        self.client.patch(detail_url(tag.id), {'name': 'Dessert'})  # type: ignore # noqa
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Dessert')  # type: ignore # noqa
+
     def test_delete_tag(self):
         """Test deleting a tag"""
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -109,10 +144,11 @@ class PrivateTagsApiTest(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
+        tag1.refresh_from_db()
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
-        self.assertIn(s1.data, res.data)  # type: ignore
-        self.assertNotIn(s2.data, res.data)  # type: ignore
+        self.assertIn(s1.data, res.data['results'])  # type: ignore
+        self.assertNotIn(s2.data, res.data['results'])  # type: ignore
 
     def test_filtered_tags_unique(self):
         """Test filtered tags returns a unique list."""
@@ -135,4 +171,17 @@ class PrivateTagsApiTest(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)  # type: ignore
+        self.assertEqual(len(res.data['results']), 1)  # type: ignore
+
+    def test_suggest_tags(self):
+        """Test tags are suggested by the start of their name"""
+        Tag.objects.create(user=self.user, name='Dinner')
+        Tag.objects.create(user=self.user, name='Dessert')
+        Tag.objects.create(user=self.user, name='Breakfast')
+
+        res = self.client.get(reverse('recipe:tag-suggest'), {'q': 'd'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Dessert', 'Dinner']
+        )
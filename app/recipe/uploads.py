@@ -0,0 +1,176 @@
+"""
+Streaming upload handling for recipe images
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.models import Recipe, recipe_image_file_path
+from recipe.images import hold_image, release_image, unhold_image
+
+
+# Leading bytes of the accepted image formats and their file extension.
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+]
+SNIFF_SIZE = 12
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded image is too large.'
+    default_code = 'upload_too_large'
+
+
+def sniff_image_extension(header):
+    """Return the file extension of the image format header starts, or
+    None when it is not an accepted image."""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return '.webp'
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    return None
+
+
+class StoredUploadedFile(UploadedFile):
+    """An uploaded file already written to its place in the storage"""
+
+    def __init__(self, file, name, storage_name, content_type, size,
+                 charset, content_type_extra=None):
+        super().__init__(
+            file, name, content_type, size, charset, content_type_extra
+        )
+        self.storage_name = storage_name
+
+    def temporary_file_path(self):
+        """Return the path of the stored file, so it is read from disk."""
+        return self.file.name
+
+
+def discard_stored_uploads(files, keep=None):
+    """Release the stored uploads in files other than the name keep.
+
+    A rejected upload's image is deleted as soon as the current
+    transaction commits, unless a recipe references the same content.
+    """
+    for _, uploads in files.lists():
+        for uploaded in uploads:
+            if isinstance(uploaded, StoredUploadedFile):
+                uploaded.close()
+                if uploaded.storage_name != keep:
+                    release_image(uploaded.storage_name)
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """Stream the image field of an upload into the recipe image storage.
+
+    Chunks are hashed as they are written to a temporary file, which is
+    then renamed to its digest name or dropped if that content is already
+    stored. The stored image is held, see hold_image(), until unhold() is
+    called. Only one chunk is held in memory at a time. Requests over
+    RECIPE_IMAGE_MAX_UPLOAD_SIZE are refused before their body is read
+    and payloads that are not an image are refused on their first bytes.
+    """
+    chunk_size = 64 * 2 ** 10
+    field_name = 'image'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.storage = Recipe._meta.get_field('image').storage
+        self.held = []
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            raise UploadTooLarge()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        # Other file fields are dropped without being stored.
+        self.skip = field_name != self.field_name
+        self.file = None
+        self.header = b''
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.skip:
+            return None
+        self.size += len(raw_data)
+        if self.size > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            self.upload_interrupted()
+            raise UploadTooLarge()
+
+        if self.file is None:
+            self.header += raw_data
+            if len(self.header) < SNIFF_SIZE:
+                return None
+            self._open_file()
+            raw_data, self.header = self.header, b''
+
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def _open_file(self):
+        """Create the temporary file, the format is taken from its header."""
+        ext = sniff_image_extension(self.header)
+        if ext is None:
+            raise ValidationError({self.field_name: [
+                'Upload a valid image. The file you uploaded was either '
+                'not an image or a corrupted image.'
+            ]})
+
+        stem = os.path.splitext(self.file_name)[0]
+        self.name = recipe_image_file_path(None, stem + ext)
+        self.temp_name, self.file = self.storage.create_temp(self.name)
+        self.sha = hashlib.sha256()
+
+    def file_complete(self, file_size):
+        if self.skip:
+            return None
+        if self.file is None:
+            # Shorter than the sniffed header.
+            self._open_file()
+            self.sha.update(self.header)
+            self.file.write(self.header)
+
+        self.file.close()
+        digest = self.sha.hexdigest()
+        # Held first, so a release cannot delete a copy this reuses.
+        final_name = self.storage.digest_name(self.name, digest)
+        hold_image(final_name)
+        self.held.append(final_name)
+        storage_name = self.storage.commit_temp(
+            self.temp_name, self.name, digest
+        )
+        return StoredUploadedFile(
+            file=open(self.storage.path(storage_name), 'rb'),
+            name=self.file_name,
+            storage_name=storage_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def unhold(self):
+        """Let the images stored by this upload be released again."""
+        for name in self.held:
+            unhold_image(name)
+        self.held = []
+
+    def upload_interrupted(self):
+        if getattr(self, 'file', None) is not None and not self.file.closed:
+            self.file.close()
+            self.storage.delete(self.temp_name)
+            self.file = None
@@ -3,6 +3,7 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
+from core.asgi import serve_async
 from recipe import views
 
 router = DefaultRouter()
@@ -13,5 +14,5 @@ router.register('ingredient', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(serve_async(router.urls)))
 ]
@@ -1,23 +1,83 @@
 """
 Views for the recipe app
 """
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import (  # type: ignore
     extend_schema_view, extend_schema,
     OpenApiParameter, OpenApiTypes
 )
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType, ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core.routers import (
+    choose_replica,
+    is_pinned_to_primary,
+    pin_to_primary,
+    read_database,
+)
+from user.authentication import CachedTokenAuthentication
+from recipe import exporters, importers, serializers
+from recipe.cache import cache_per_user, etag_per_user, invalidate_user
+from recipe.filters import (
+    RecipeAttrFilter,
+    RecipeAttrOrderingFilter,
+    RecipeOrderingFilter,
+    RecipeRangeFilter,
+    RecipeSearchFilter,
+)
+from recipe.images import schedule_image_processing
+from recipe.uploads import RecipeImageUploadHandler, discard_stored_uploads
+from recipe.search import suggest_by_name
+from recipe.renderers import CSVRenderer, NDJSONRenderer
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
+
+
+class ReplicaReadMixin:
+    """Serve safe requests from a read replica when there are some.
+
+    Reads stay on the primary for a while after a write of the user, so
+    they see their own writes.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = read_database.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_database.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and request.method in SAFE_METHODS \
+                and not is_pinned_to_primary(request.user.pk):
+            read_database.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # The write is committed by now, pin before the client can read.
+        if settings.DATABASE_REPLICAS and \
+                request.method not in SAFE_METHODS and \
+                request.user.is_authenticated:
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
 
 
 @extend_schema_view(
     list=extend_schema(
         parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Search text, matching recipes are ranked by '
+                            'relevance'
+            ),
             OpenApiParameter(
                 'tags',
                 OpenApiTypes.STR,
@@ -27,36 +87,122 @@ from recipe import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma Seperated list of ingredient IDs to filter'
-            )
+            ),
+            OpenApiParameter(
+                'tags_mode',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Match recipes with any (default) or all tags'
+            ),
+            OpenApiParameter(
+                'ingredients_mode',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Match recipes with any (default) or all '
+                            'ingredients'
+            ),
+            OpenApiParameter(
+                'time_minutes__gte', OpenApiTypes.INT,
+                description='Minimum cooking time in minutes'
+            ),
+            OpenApiParameter(
+                'time_minutes__lte', OpenApiTypes.INT,
+                description='Maximum cooking time in minutes'
+            ),
+            OpenApiParameter(
+                'price__gte', OpenApiTypes.DECIMAL,
+                description='Minimum price'
+            ),
+            OpenApiParameter(
+                'price__lte', OpenApiTypes.DECIMAL,
+                description='Maximum price'
+            ),
+            OpenApiParameter(
+                'fields',
+                OpenApiTypes.STR,
+                description='Comma separated list of the fields to return, '
+                            'all of them by default'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=['id', '-id', 'time_minutes', '-time_minutes',
+                      'price', '-price'],
+                description='Sort order, by relevance when searching and '
+                            'newest first ("-id") otherwise'
+            ),
         ]
-    )
+    ),
+    retrieve=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'fields',
+                OpenApiTypes.STR,
+                description='Comma separated list of the fields to return, '
+                            'all of them by default'
+            ),
+        ]
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
-
-    def _params_to_ints(self, qs):
-        """Convert a list of strings to integers."""
-        print(qs)
-        return [int(str_id) for str_id in qs.split(',')]
+    pagination_class = RecipeCursorPagination
+    filter_backends = [
+        RecipeAttrFilter, RecipeRangeFilter, RecipeSearchFilter,
+        RecipeOrderingFilter,
+    ]
 
     def get_queryset(self):
         """Retrieve recipe for authenticated user."""
-        tags = self.request.query_params.get('tags')  # type: ignore
-        ingredients = self.request.query_params.get('ingredients')  # type: ignore # noqa
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        queryset = self.queryset.filter(
+            user=self.request.user).order_by('-id')
+
+        serializer_class = self.get_serializer_class()
+        if self.action in ('list', 'retrieve') and \
+                hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(
+                queryset, self.get_requested_fields(),
+                self.get_ordering_columns(),
+            )
+
+        return queryset
+
+    def get_requested_fields(self):
+        """Return the fields named in ?fields=, or None for all of them"""
+        value = self.request.query_params.get('fields')  # type: ignore
+        if not value or self.action not in ('list', 'retrieve'):
+            return None
 
-        return queryset.filter(
-            user=self.request.user).order_by('-id').distinct()
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        available = self.get_serializer_class()().fields
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            raise ValidationError({
+                'fields': f'Unknown fields {unknown}, expected some of '
+                          f'{list(available)}.'
+            })
+        return fields
+
+    def get_ordering_columns(self):
+        """Return the columns the pagination reads from listed recipes"""
+        if self.action != 'list':
+            return []
+        ordering = RecipeOrderingFilter().get_ordering(
+            self.request, self.queryset, self
+        )
+        return [
+            field.lstrip('-') for field in ordering
+            if field.lstrip('-') != 'rank'
+        ]
+
+    def get_serializer_context(self):
+        """Pass the requested fields on to the serializer"""
+        context = super().get_serializer_context()
+        if getattr(self, 'request', None) is not None:
+            context['fields'] = self.get_requested_fields()
+        return context
 
     def get_serializer_class(self):
         """Return the serializer class for request"""
@@ -67,21 +213,103 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return self.serializer_class
 
+    @etag_per_user
+    @cache_per_user
+    def list(self, request, *args, **kwargs):
+        """List the user's recipes, cached per user"""
+        return super().list(request, *args, **kwargs)
+
+    @etag_per_user
+    @cache_per_user
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, cached per user"""
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """Delete a recipe"""
+        instance.delete()
+        invalidate_user(self.request.user.pk)
+
+    @extend_schema(
+        request={
+            content_type: OpenApiTypes.BINARY
+            for content_type in importers.CONTENT_TYPES
+        },
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(methods=['POST'], detail=False, url_path='import')
+    def bulk_import(self, request):
+        """Create recipes from an NDJSON or CSV request body."""
+        content_type = request.content_type.split(';')[0].strip()
+        data_format = importers.CONTENT_TYPES.get(content_type)
+        if data_format is None:
+            raise UnsupportedMediaType(content_type)
+
+        # Read the body as a stream, it is never held in memory whole.
+        lines = request.stream or []
+        results = list(importers.import_recipes(
+            request.user, importers.PARSERS[data_format](lines)
+        ))
+        created = sum('id' in result for result in results)
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'format', OpenApiTypes.STR, enum=['ndjson', 'csv'],
+                description='Export format, ndjson by default'
+            )
+        ],
+        responses={
+            (200, renderer.media_type): OpenApiTypes.BINARY
+            for renderer in (NDJSONRenderer, CSVRenderer)
+        },
+    )
+    @action(methods=['GET'], detail=False,
+            renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """Stream all the user's recipes as NDJSON or CSV."""
+        renderer = request.accepted_renderer
+        lines = exporters.WRITERS[renderer.format](
+            exporters.iter_recipes(request.user)
+        )
+        response = StreamingHttpResponse(
+            lines, content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{renderer.format}"'
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """Upload an image to recipe."""
         recipe = self.get_object()
-        serializer = self.get_serializer(recipe, data=request.data)
+        upload_handler = RecipeImageUploadHandler(request)
+        request.upload_handlers = [upload_handler]
+        keep = None
+        try:
+            serializer = self.get_serializer(recipe, data=request.data)
+            if not serializer.is_valid():
+                return Response(
+                    serializer.errors, status=status.HTTP_400_BAD_REQUEST
+                )
+            recipe = serializer.save()
+            keep = recipe.image.name
+        finally:
+            discard_stored_uploads(request.FILES, keep=keep)
+            upload_handler.unhold()
 
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        schedule_image_processing(recipe)
+        invalidate_user(request.user.pk)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 @extend_schema_view(
@@ -91,16 +319,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipe'
-            )
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=['name', '-name', 'recipe_count', '-recipe_count'],
+                description='Sort by name (default "-name") or by how many '
+                            'recipes use each item'
+            ),
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.UpdateModelMixin, mixins.ListModelMixin,
-                            mixins.DestroyModelMixin, viewsets.GenericViewSet):
+class BaseRecipeAttrViewSet(ReplicaReadMixin, mixins.UpdateModelMixin,
+                            mixins.ListModelMixin, mixins.DestroyModelMixin,
+                            viewsets.GenericViewSet):
     """Base view set for recipe attributes"""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    filter_backends = [RecipeAttrOrderingFilter]
 
     def get_queryset(self):
         """Filter querset to authenticated user"""
@@ -109,9 +347,47 @@ class BaseRecipeAttrViewSet(mixins.UpdateModelMixin, mixins.ListModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)  # type: ignore
+            # Answered from the partial index on assigned rows, without
+            # joining recipes.
+            queryset = queryset.filter(recipe_count__gt=0)  # type: ignore
         return queryset.filter(  # type: ignore
-            user=self.request.user).order_by('-name').distinct()
+            user=self.request.user).order_by('-name')
+
+    @etag_per_user
+    @cache_per_user
+    def list(self, request, *args, **kwargs):
+        """List the user's objects, cached per user"""
+        return super().list(request, *args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q', OpenApiTypes.STR, required=True,
+                description='Start or approximate spelling of the name'
+            )
+        ]
+    )
+    @action(methods=['GET'], detail=False)
+    @cache_per_user
+    def suggest(self, request):
+        """Suggest the user's objects whose name matches ?q= as typed"""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This query parameter is required.'})
+        matches = suggest_by_name(
+            self.get_queryset(), text, settings.RECIPE_SUGGEST_LIMIT
+        )
+        return Response(self.get_serializer(matches, many=True).data)
+
+    def perform_update(self, serializer):
+        """Update an object"""
+        serializer.save()
+        invalidate_user(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        """Delete an object"""
+        instance.delete()
+        invalidate_user(self.request.user.pk)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -0,0 +1,193 @@
+"""
+Authentication classes for the apis
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.models import AuthToken
+
+
+class LocalTTLCache:
+    """Thread safe in-process LRU cache whose entries expire after ttl"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the live value for key or None."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value for key, evicting the least recently used."""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Drop key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
+
+
+local_tokens = LocalTTLCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    settings.AUTH_TOKEN_LOCAL_CACHE_TTL,
+)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    """Increment the named token cache counter."""
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def token_cache_stats():
+    """Return the token cache hit and miss counters of this process."""
+    with _stats_lock:
+        return {
+            'local_hits': _stats['local_hits'],
+            'shared_hits': _stats['shared_hits'],
+            'misses': _stats['misses'],
+        }
+
+
+def token_cache_key(key_hash):
+    """Return the shared cache key for a token, without the raw token."""
+    return f'auth-token:{key_hash}'
+
+
+def invalidate_token(key_hash):
+    """Forget a cached token in this process and the shared cache.
+
+    Other processes drop their local copy when its short TTL runs out.
+    """
+    local_tokens.delete(key_hash)
+    cache.delete(token_cache_key(key_hash))
+
+
+def _field_values(obj, exclude=()):
+    """Return the concrete field values of a model instance by attname."""
+    return {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields
+        if field.attname not in exclude
+    }
+
+
+def _from_values(model, values):
+    """Build an instance of model as loaded from the primary, any field
+    missing from values deferred."""
+    return model.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+
+def token_cache_entry(token):
+    """Return the primitives cached for a token and its user.
+
+    The user's password hash is left out, it has no business in a shared
+    cache and authenticating does not need it.
+    """
+    return {
+        'token': _field_values(token),
+        'user': _field_values(token.user, exclude=('password',)),
+    }
+
+
+def token_from_cache_entry(entry):
+    """Build a new token and user from a cached entry.
+
+    Every request gets its own instances, so one request changing its user
+    never shows in another's. The password stays deferred and is loaded
+    from the database if used.
+    """
+    token = _from_values(AuthToken, entry['token'])
+    token.user = _from_values(get_user_model(), entry['user'])
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Authentication with expiring AuthTokens that caches token lookups.
+
+    Keys are hashed and looked up by the unique key_hash index. A TTL
+    bounded in-process LRU sits in front of the shared cache, which sits
+    in front of the database. Both hold the token's and user's field
+    values, never model instances. Entries are dropped when the token is
+    deleted or its user is saved, e.g. deactivated, and never outlive the
+    token's expiry.
+    """
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        key_hash = AuthToken.hash_key(key)
+        entry = local_tokens.get(key_hash)
+        if entry is not None:
+            _count('local_hits')
+        else:
+            entry = cache.get(token_cache_key(key_hash))
+            if entry is not None:
+                _count('shared_hits')
+            else:
+                _count('misses')
+                token = self._get_token(key_hash)
+                entry = token_cache_entry(token)
+                cache.set(
+                    token_cache_key(key_hash), entry,
+                    min(settings.AUTH_TOKEN_CACHE_TIMEOUT,
+                        self._seconds_left(token)),
+                )
+            local_tokens.set(key_hash, entry)
+
+        token = token_from_cache_entry(entry)
+        if token.is_expired:
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        return (token.user, token)
+
+    def _get_token(self, key_hash):
+        """Return the token with key_hash, with its active user."""
+        try:
+            token = AuthToken.objects.select_related('user').get(
+                key_hash=key_hash
+            )
+        except AuthToken.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return token
+
+    def _seconds_left(self, token):
+        """Return the whole seconds until token expires, at least 1."""
+        left = token.expires_at - timezone.now()
+        return max(int(left.total_seconds()), 1)
@@ -0,0 +1,85 @@
+"""
+Password verification off the event loop for async views
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_login_failed
+from django.contrib.auth.hashers import check_password, make_password
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the password hashing pool, created on first use.
+
+    Its size bounds how many hashes run at once, so a login storm queues
+    up instead of starving the other requests of CPU. The hashers
+    release the GIL, so the threads use as many cores.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix='password-hash',
+            )
+    return _executor
+
+
+async def run_hasher(func, *args):
+    """Run a hashing function in the pool and wait for its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), func, *args)
+
+
+@sync_to_async
+def _get_user(email):
+    """Return the user with email, or None."""
+    User = get_user_model()
+    try:
+        return User._default_manager.get_by_natural_key(email)
+    except User.DoesNotExist:
+        return None
+
+
+@sync_to_async
+def _save_password(user, encoded):
+    """Store a user's upgraded password hash."""
+    user.password = encoded
+    user.save(update_fields=['password'])
+
+
+async def authenticate_async(request, email, password):
+    """Return the active user with email and password, or None.
+
+    This does what authenticate() does with ModelBackend, but hashes in
+    the pool. Unknown emails still cost one hash, so response times do
+    not tell which emails have accounts. Hashes made by an older hasher
+    or with older parameters are replaced when the password matches.
+    """
+    user = await _get_user(email)
+    if user is None:
+        await run_hasher(make_password, password)
+    else:
+        upgraded = []
+        valid = await run_hasher(
+            check_password, password, user.password,
+            lambda raw: upgraded.append(make_password(raw)),
+        )
+        if upgraded:
+            await _save_password(user, upgraded[0])
+        if valid and user.is_active:
+            return user
+
+    await sync_to_async(user_login_failed.send)(
+        sender=__name__, request=request,
+        credentials={'username': email, 'password': '********'},
+    )
+    return None
@@ -10,6 +10,9 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
 
+AUTHENTICATION_FAILED = _('Unable to authenticate with provided credentials.')
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object"""
 
@@ -36,14 +39,18 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AuthTokenSerializer(serializers.Serializer):
-    """Serializer for the user auth token"""
+class AuthCredentialsSerializer(serializers.Serializer):
+    """Serializer for the credentials of a login"""
     email = serializers.EmailField()
     password = serializers.CharField(
         style={'input_type': 'password'},
         trim_whitespace=False
     )
 
+
+class AuthTokenSerializer(AuthCredentialsSerializer):
+    """Serializer for the user auth token"""
+
     def validate(self, attrs):
         """Validate and authenticate user"""
         email = attrs.get('email')
@@ -54,8 +61,20 @@ class AuthTokenSerializer(serializers.Serializer):
             password=password
         )
         if not user:
-            msg = _('Unable to authenticate with provided credentials.')
-            raise serializers.ValidationError(msg, code='authoriztion')
+            raise serializers.ValidationError(
+                AUTHENTICATION_FAILED, code='authoriztion'
+            )
 
         attrs['user'] = user
         return attrs
+
+
+class IssuedTokenSerializer(serializers.Serializer):
+    """Serializer for a newly issued auth token and its expiry"""
+    token = serializers.CharField()
+    expires_at = serializers.DateTimeField()
+
+    @classmethod
+    def for_token(cls, token, key):
+        """Return the serializer for token, issued with key"""
+        return cls({'token': key, 'expires_at': token.expires_at})
@@ -0,0 +1,27 @@
+"""
+Signal handlers for the user app
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import AuthToken
+from user.authentication import invalidate_token
+
+
+@receiver(post_delete, sender=AuthToken)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Drop a deleted token from the token caches"""
+    invalidate_token(instance.key_hash)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Drop a saved user's tokens from the token caches, so changes
+    such as is_active apply on the next request"""
+    if created:
+        return
+    key_hashes = AuthToken.objects.filter(user=instance).values_list(
+        'key_hash', flat=True)
+    for key_hash in key_hashes:
+        invalidate_token(key_hash)
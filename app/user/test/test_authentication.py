@@ -0,0 +1,200 @@
+"""
+Tests for the cached token authentication
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+from user.authentication import (
+    CachedTokenAuthentication,
+    local_tokens,
+    token_cache_key,
+    token_cache_stats,
+)
+
+
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and invalidated"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email='test@example.com', password='testpass123'
+        )
+        self.token, self.key = AuthToken.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def tearDown(self):
+        local_tokens.clear()
+        cache.clear()
+
+    def test_repeated_requests_skip_token_query(self):
+        """Test the token is only looked up in the database once"""
+        before = token_cache_stats()
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], self.user.email)  # type: ignore
+        after = token_cache_stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['local_hits'] - before['local_hits'], 1)
+
+    def test_shared_cache_used_after_local_expiry(self):
+        """Test other processes reuse the lookup from the shared cache"""
+        self.client.get(ME_URL)
+        local_tokens.clear()
+        before = token_cache_stats()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            token_cache_stats()['shared_hits'] - before['shared_hits'], 1
+        )
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token is not served from the cache"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates the cached token"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        """Test a cached token stops working once it expires"""
+        self.client.get(ME_URL)
+
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        local_tokens.clear()
+        cache.clear()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_token_checks_expiry(self):
+        """Test the expiry is checked on cache hits too"""
+        self.client.get(ME_URL)
+        cached = local_tokens.get(AuthToken.hash_key(self.key))
+        cached['token']['expires_at'] = timezone.now() - timedelta(seconds=1)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_holds_no_password(self):
+        """Test the shared cache never holds the user's password hash"""
+        self.client.get(ME_URL)
+
+        entry = cache.get(token_cache_key(AuthToken.hash_key(self.key)))
+
+        self.assertNotIn('password', entry['user'])
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_each_request_gets_its_own_user(self):
+        """Test cache hits build a new user for every request"""
+        authentication = CachedTokenAuthentication()
+        first, _ = authentication.authenticate_credentials(self.key)
+        second, _ = authentication.authenticate_credentials(self.key)
+
+        first.name = 'Changed'
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.name, self.user.name)
+
+    def test_update_cached_user_keeps_password(self):
+        """Test updating the user authenticated from the cache saves its
+        fields without touching the password"""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {'name': 'New name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'New name')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+
+class AuthTokenApiTests(TestCase):
+    """Test issuing and rotating expiring tokens"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # type: ignore
+            email='test@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+
+    def tearDown(self):
+        local_tokens.clear()
+        cache.clear()
+
+    def login(self):
+        """Log in and return the issued token data"""
+        res = self.client.post(
+            TOKEN_URL, {'email': self.user.email, 'password': 'testpass123'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_token_stored_as_hash(self):
+        """Test only a hash of an issued key is stored, with an expiry"""
+        data = self.login()
+
+        token = AuthToken.objects.get(user=self.user)
+        self.assertEqual(token.key_hash, AuthToken.hash_key(data['token']))
+        self.assertNotIn(data['token'], token.key_hash)
+        self.assertGreater(token.expires_at, timezone.now())
+        self.assertIn('expires_at', data)
+
+    def test_refresh_rotates_token(self):
+        """Test refreshing issues a new token and revokes the old one"""
+        old = self.login()['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {old}')
+        self.client.get(ME_URL)
+
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        new = res.data['token']  # type: ignore
+        self.assertNotEqual(new, old)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new}')
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 1)
+
+    def test_refresh_requires_token(self):
+        """Test refreshing without a token is refused"""
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,132 @@
+"""
+Tests for logins hashing in the worker pool
+"""
+import json
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+
+from user.views import CreateTokenView, create_token_async
+
+
+TOKEN_URL = reverse('user:token')
+
+
+def create_pbkdf2_user(email='test@example.com', password='testpass123'):
+    """Create a user whose password was hashed with PBKDF2"""
+    with override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ]):
+        return get_user_model().objects.create_user(  # type: ignore
+            email, password
+        )
+
+
+class RehashOnLoginTests(TestCase):
+    """Test old password hashes are upgraded when users log in"""
+
+    def test_token_login_rehashes(self):
+        """Test logging in replaces a PBKDF2 hash with the preferred one"""
+        user = create_pbkdf2_user()
+
+        res = APIClient().post(
+            TOKEN_URL, {'email': user.email, 'password': 'testpass123'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).algorithm,
+                         get_hasher().algorithm)
+        self.assertTrue(user.check_password('testpass123'))
+
+
+class CreateTokenAsyncTests(TestCase):
+    """Test the async token view"""
+
+    def post(self, payload):
+        """Post payload as JSON to the async token view"""
+        request = RequestFactory().post(
+            TOKEN_URL, payload, content_type='application/json'
+        )
+        return async_to_sync(create_token_async)(request)
+
+    def test_create_token_and_rehash(self):
+        """Test valid credentials get the user's token and an upgraded
+        hash"""
+        user = create_pbkdf2_user()
+
+        res = self.post({'email': user.email, 'password': 'testpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        key = json.loads(res.content)['token']
+        self.assertEqual(AuthToken.objects.get(user=user).key_hash,
+                         AuthToken.hash_key(key))
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).algorithm,
+                         get_hasher().algorithm)
+
+    def test_bad_credentials(self):
+        """Test wrong passwords, unknown emails and invalid payloads are
+        refused"""
+        user = create_pbkdf2_user()
+        for payload in [
+            {'email': user.email, 'password': 'wrongpass'},
+            {'email': 'nobody@example.com', 'password': 'testpass123'},
+            {'email': user.email, 'password': ''},
+        ]:
+            res = self.post(payload)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(AuthToken.objects.exists())
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    def test_get_not_allowed(self):
+        """Test only POST is allowed"""
+        request = RequestFactory().get(TOKEN_URL)
+
+        res = async_to_sync(create_token_async)(request)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_inactive_user_refused(self):
+        """Test inactive users get no token"""
+        user = create_pbkdf2_user()
+        user.is_active = False
+        user.save()
+
+        res = self.post({'email': user.email, 'password': 'testpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', json.loads(res.content))
+
+    def test_parse_errors_match_sync_view(self):
+        """Test unsupported and malformed bodies get the same responses as
+        from CreateTokenView"""
+        for content_type, body, status_code in [
+            ('text/plain', 'email=test@example.com',
+             status.HTTP_415_UNSUPPORTED_MEDIA_TYPE),
+            ('application/json', '{"email": ',
+             status.HTTP_400_BAD_REQUEST),
+        ]:
+            def request():
+                return RequestFactory().post(
+                    TOKEN_URL, body, content_type=content_type
+                )
+            expected = CreateTokenView.as_view()(request()).render()
+
+            res = async_to_sync(create_token_async)(request())
+
+            self.assertEqual(expected.status_code, status_code)
+            self.assertEqual(res.status_code, status_code)
+            self.assertEqual(json.loads(res.content),
+                             json.loads(expected.content))
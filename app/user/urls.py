@@ -1,4 +1,5 @@
 """Urls mapping for the user api"""
+from django.conf import settings
 from django.urls import path
 
 from user import views
@@ -8,6 +9,16 @@ app_name = 'user'
 
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
-    path('token/', views.CreateTokenView.as_view(), name='token'),
+    path(
+        'token/',
+        views.create_token_async
+        if settings.AUTH_TOKEN_VIEW_ASYNC else
+        views.CreateTokenView.as_view(),
+        name='token',
+    ),
+    path(
+        'token/refresh/', views.RefreshTokenView.as_view(),
+        name='token-refresh'
+    ),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
@@ -1,11 +1,29 @@
 """
 Views for the user api.
 """
-from rest_framework import generics, authentication, permissions
+from asgiref.sync import sync_to_async
+
+from django.db import transaction
+from django.http import HttpResponseNotAllowed, JsonResponse
+from drf_spectacular.utils import extend_schema  # type: ignore
+
+from rest_framework import exceptions, generics, permissions
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.views import APIView
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from core.models import AuthToken
+from user.authentication import CachedTokenAuthentication
+from user.hashing import authenticate_async
+from user.serializers import (
+    AUTHENTICATION_FAILED,
+    AuthCredentialsSerializer,
+    IssuedTokenSerializer,
+    UserSerializer,
+    AuthTokenSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -18,11 +36,73 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    @extend_schema(responses=IssuedTokenSerializer)
+    def post(self, request, *args, **kwargs):
+        """Issue a new expiring token for valid credentials"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, key = AuthToken.issue(serializer.validated_data['user'])
+        return Response(IssuedTokenSerializer.for_token(token, key).data)
+
+
+class RefreshTokenView(APIView):
+    """Rotate the auth token of the request"""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(request=None, responses=IssuedTokenSerializer)
+    def post(self, request):
+        """Replace the request's token with a new one, which expires a
+        full lifetime from now"""
+        with transaction.atomic():
+            deleted, _ = AuthToken.objects.filter(
+                pk=request.auth.pk).delete()
+            if not deleted:
+                # Refreshed by a concurrent request.
+                raise exceptions.AuthenticationFailed()
+            token, key = AuthToken.issue(request.user)
+        return Response(IssuedTokenSerializer.for_token(token, key).data)
+
+
+async def create_token_async(request):
+    """Create a new auth token for user, hashing off the event loop.
+
+    Bodies are parsed by the parsers of CreateTokenView, so it takes the
+    same requests and gives the same responses, errors included. Under
+    ASGI the password is verified in the bounded hashing pool, so a login
+    storm does not hold up other requests. Django 3.2 only runs function
+    views natively async.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    parsers = [parser() for parser in CreateTokenView.parser_classes]
+    try:
+        data = Request(request, parsers=parsers).data
+    except exceptions.APIException as exc:
+        return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    serializer = AuthCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    user = await authenticate_async(request, **serializer.validated_data)
+    if user is None:
+        return JsonResponse(
+            {'non_field_errors': [str(AUTHENTICATION_FAILED)]}, status=400
+        )
+    token, key = await sync_to_async(AuthToken.issue)(user)
+    return JsonResponse(IssuedTokenSerializer.for_token(token, key).data)
+
+
+# Token requests carry no session, like every DRF view. The csrf_exempt
+# decorator would hide that the view is async.
+create_token_async.csrf_exempt = True  # type: ignore
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """View class for managing authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):